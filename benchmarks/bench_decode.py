@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""Vergleicht das alte Dekodieren (volle Auflösung + rotate + resize) mit decode_for_display.
+
+Aufruf:  python3 benchmarks/bench_decode.py [bilder-verzeichnis] [--rotation 90] [--runs 20]
+
+Ohne Verzeichnis werden synthetische 640x640-Cover erzeugt. Jede Variante
+läuft in einem eigenen Prozess, damit der Speicher-Peak (VmHWM) sauber
+getrennt gemessen wird.
+"""
+import argparse
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WIDTH = HEIGHT = 240
+
+
+def decode_old(source, rotation):
+    from PIL import Image
+    image = Image.open(source).convert("RGB")
+    if rotation != 0:
+        image = image.rotate(rotation, expand=True)
+    return image.resize((WIDTH, HEIGHT))
+
+
+def decode_new(source, rotation):
+    from libs.image_decode import decode_for_display
+    return decode_for_display(source, WIDTH, HEIGHT, rotation)
+
+
+def synthetic_corpus(directory, count=8, size=640):
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(1)
+    for i in range(count):
+        y, x = np.mgrid[0:size, 0:size]
+        base = rng.integers(0, 255, 3)
+        arr = np.stack([(x * (i + 1) + base[0]) % 256, (y * 2 + base[1]) % 256, ((x + y) // 3 + base[2]) % 256], axis=-1)
+        Image.fromarray(arr.astype("uint8")).save(Path(directory) / f"cover_{i}.jpg", "JPEG", quality=90)
+
+
+def load_corpus(directory):
+    files = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    return [p.read_bytes() for p in files]
+
+
+def peak_rss_kb():
+    # VmHWM wird (anders als ru_maxrss) bei exec zurückgesetzt
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def worker(method, directory, rotation, runs):
+    corpus = load_corpus(directory)
+    decode = decode_old if method == "old" else decode_new
+    import libs.image_decode  # noqa: F401  Imports vor der Baseline
+    baseline = peak_rss_kb()
+
+    start = time.process_time()
+    for _ in range(runs):
+        for data in corpus:
+            decode(io.BytesIO(data), rotation)
+    cpu = time.process_time() - start
+
+    peak = peak_rss_kb()
+    print(json.dumps({
+        "images": runs * len(corpus),
+        "cpu_ms_per_image": cpu * 1000 / (runs * len(corpus)),
+        "peak_rss_kb": peak,
+        "peak_delta_kb": peak - baseline,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode-Benchmark für Cover-Bilder")
+    parser.add_argument("directory", nargs="?")
+    parser.add_argument("--rotation", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--worker", choices=["old", "new"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.directory, args.rotation, args.runs)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.directory
+        if not directory:
+            synthetic_corpus(tmp)
+            directory = tmp
+
+        results = {}
+        for method in ("old", "new"):
+            cmd = [sys.executable, __file__, "--worker", method, "--rotation", str(args.rotation), "--runs", str(args.runs), directory]
+            results[method] = json.loads(subprocess.check_output(cmd))
+
+    print(f"{'':6} {'ms/Bild':>10} {'Peak RSS':>12} {'Δ Peak':>10}")
+    for method, r in results.items():
+        print(f"{method:6} {r['cpu_ms_per_image']:10.2f} {r['peak_rss_kb']:>9} KB {r['peak_delta_kb']:>7} KB")
+    speedup = results["old"]["cpu_ms_per_image"] / max(results["new"]["cpu_ms_per_image"], 1e-9)
+    print(f"Speedup: {speedup:.1f}x bei {results['new']['images']} Dekodierungen")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""Vergleicht den Speicherbedarf: vier Einzeldienste gegen musiccontrol.py.
+
+Aufruf:  python3 benchmarks/bench_memory.py [--settle 30]
+         python3 benchmarks/bench_memory.py --imports-only
+
+Ohne Option werden nacheinander die vier Dienste (status, web, display,
+rfid) und danach musiccontrol.py gestartet und nach `--settle` Sekunden
+RSS und PSS aller Prozesse summiert (PSS aus /proc/<pid>/smaps_rollup
+verteilt geteilte Seiten anteilig und ist damit die ehrlichere Summe).
+Die systemd-Units vorher stoppen, sonst sind die Ports belegt.
+
+Mit --imports-only wird nur importiert: jedes Dienstmodul in einem
+eigenen Interpreter gegen alle vier zusammen in einem – das zeigt den
+Anteil, der allein durch doppelt geladene Bibliotheken entsteht, und
+läuft auch ohne Spotify-Zugang und Hardware-Zugriff.
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVICES = ("status", "web", "display", "rfid")
+
+# Hält den Interpreter nach dem Import an, bis stdin geschlossen wird
+IMPORT_SNIPPET = (
+    "import sys; sys.argv = [sys.argv[0]]; sys.path.insert(0, {root!r})\n"
+    "for name in {modules!r}: __import__(name)\n"
+    "print('ready', file=sys.stderr, flush=True); sys.stdin.read()\n"
+)
+
+
+def memory_kib(pid):
+    """(RSS, PSS) eines Prozesses in KiB; PSS ist None, wenn smaps_rollup fehlt."""
+    rss = pss = None
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def total(processes):
+    values = [memory_kib(p.pid) for p in processes]
+    rss = sum(v[0] for v in values)
+    pss = sum(v[1] for v in values) if all(v[1] is not None for v in values) else None
+    return rss, pss
+
+
+def stop(processes):
+    for p in processes:
+        p.terminate()
+    for p in processes:
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def run_scripts(scripts, settle):
+    processes = [
+        subprocess.Popen([sys.executable, str(ROOT / script)], cwd=ROOT,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for script in scripts
+    ]
+    try:
+        time.sleep(settle)
+        dead = [s for s, p in zip(scripts, processes) if p.poll() is not None]
+        if dead:
+            raise SystemExit(f"Beendet vor der Messung: {', '.join(dead)}")
+        return total(processes)
+    finally:
+        stop(processes)
+
+
+def wait_ready(process):
+    """Liest stderr bis zur Meldung „ready“ (Logs gehen nach stdout, Warnungen nach stderr)."""
+    for line in process.stderr:
+        if line.strip() == "ready":
+            return True
+    return False
+
+
+def run_imports(groups):
+    processes = []
+    try:
+        for modules in groups:
+            code = IMPORT_SNIPPET.format(root=str(ROOT), modules=list(modules))
+            p = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, stdin=subprocess.PIPE,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            processes.append(p)
+            if not wait_ready(p):
+                raise SystemExit(f"Import fehlgeschlagen: {', '.join(modules)}")
+        return total(processes)
+    finally:
+        for p in processes:
+            p.stdin.close()
+        stop(processes)
+
+
+def fmt(value):
+    return f"{value / 1024:10.1f}" if value is not None else f"{'–':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--settle", type=float, default=30, help="Sekunden bis zur Messung")
+    parser.add_argument("--imports-only", action="store_true", help="nur Modul-Importe vergleichen")
+    args = parser.parse_args()
+
+    if args.imports_only:
+        separate = run_imports([(name,) for name in SERVICES])
+        combined = run_imports([SERVICES])
+    else:
+        separate = run_scripts([f"{name}.py" for name in SERVICES], args.settle)
+        combined = run_scripts(["musiccontrol.py"], args.settle)
+
+    print(f"{'':14} {'RSS MiB':>10} {'PSS MiB':>10}")
+    print(f"{'4 Prozesse':14} {fmt(separate[0])} {fmt(separate[1])}")
+    print(f"{'1 Prozess':14} {fmt(combined[0])} {fmt(combined[1])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""Vergleicht die RGB565-Umrechnung: alte Shift-Variante, Converter-Modi plain/lut und Bayer-Dithering.
+
+Aufruf:  python3 benchmarks/bench_rgb565.py [bilder-verzeichnis] [--runs 200]
+
+Gemessen werden Zeit pro Frame sowie der Fehler gegenüber dem 8-Bit-
+Original: einmal pixelweise (MAE) und einmal nach einem 4x4-Weichzeichner
+(„Banding“ – so nimmt das Auge Dithering aus Betrachtungsabstand wahr).
+Ohne Verzeichnis werden synthetische Verläufe erzeugt.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from libs import rgb565  # noqa: E402
+
+WIDTH = HEIGHT = 240
+
+METHODS = {
+    "alt": lambda image: rgb565.to_rgb565_shift(image),
+    "plain": lambda image: rgb565.to_rgb565(image, "plain"),
+    "lut": lambda image: rgb565.to_rgb565(image, "lut"),
+    "dither": lambda image: rgb565.to_rgb565(image, "dither"),
+}
+
+
+def synthetic_corpus(count=4):
+    y, x = np.mgrid[0:HEIGHT, 0:WIDTH]
+    images = []
+    for i in range(count):
+        # Flache Verläufe wie bei Himmel oder Vignetten in Album-Covern
+        r = 40 + x * (30 + 10 * i) // WIDTH
+        g = 60 + y * 25 // HEIGHT
+        b = 90 + (x + y) * (20 + 5 * i) // (WIDTH + HEIGHT)
+        images.append(Image.fromarray(np.stack([r, g, b], axis=-1).astype(np.uint8)))
+    return images
+
+
+def load_corpus(directory):
+    from libs.image_decode import decode_for_display
+    files = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    return [decode_for_display(p, WIDTH, HEIGHT) for p in files]
+
+
+def decode565(frame):
+    """RGB565 → 8 Bit je Kanal (Bit-Replikation wie im Panel)."""
+    v = np.frombuffer(frame, dtype=">u2").reshape(HEIGHT, WIDTH).astype(np.int32)
+    r, g, b = v >> 11, (v >> 5) & 0x3F, v & 0x1F
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1).astype(np.float64)
+
+
+def blur(a, k=4):
+    h, w = a.shape[0] // k * k, a.shape[1] // k * k
+    return a[:h, :w].reshape(h // k, k, w // k, k, -1).mean(axis=(1, 3))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", nargs="?")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    images = load_corpus(args.directory) if args.directory else synthetic_corpus()
+
+    print(f"{'':12} {'ms/Frame':>10} {'MAE':>8} {'Banding':>10}")
+    for name, convert in METHODS.items():
+        convert(images[0])  # Puffer/Tabellen anlegen
+        start = time.perf_counter()
+        for i in range(args.runs):
+            convert(images[i % len(images)])
+        ms = (time.perf_counter() - start) * 1000 / args.runs
+
+        mae = banding = 0.0
+        for image in images:
+            original = np.asarray(image, dtype=np.float64)
+            shown = decode565(convert(image))
+            mae += np.abs(shown - original).mean()
+            banding += np.abs(blur(shown) - blur(original)).mean()
+        print(f"{name:12} {ms:10.3f} {mae / len(images):8.2f} {banding / len(images):10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""Lasttest für status.py: Display-Polling (GET /status) plus parallele RFID-POSTs.
+
+Aufruf:  python3 benchmarks/bench_status.py [--seconds 10] [--pollers 4] [--posters 1]
+
+Vergleicht den Flask-Entwicklungsserver (ein Thread pro Verbindung) mit dem
+Pool-Server aus libs/serving.py (feste Worker-Zahl). Beide schließen die
+Verbindung nach jeder Antwort. Die Poller fragen wie display.py über eine
+requests.Session ab, nur ohne Pause (Sättigung); die Poster
+schreiben wie rfid.py eine Folge reading → writing → success.
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+from werkzeug.serving import make_server as make_dev_server
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import status  # noqa: E402
+from libs.serving import make_server  # noqa: E402
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else 0.0
+
+
+def run_load(port, seconds, pollers, posters):
+    url = f"http://127.0.0.1:{port}/status"
+    stop = threading.Event()
+    get_latencies, post_latencies = [], []
+    errors = [0]
+
+    def poll():
+        session = requests.Session()
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                session.get(url, timeout=2).json()
+                local.append(time.perf_counter() - start)
+            except Exception:
+                errors[0] += 1
+        get_latencies.extend(local)
+
+    def post():
+        session = requests.Session()
+        local = []
+        states = ["reading", "writing", "success"]
+        i = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                session.post(url, json={"status": states[i % 3]}, timeout=2)
+                local.append(time.perf_counter() - start)
+            except Exception:
+                errors[0] += 1
+            i += 1
+            time.sleep(0.05)
+        post_latencies.extend(local)
+
+    threads = [threading.Thread(target=poll) for _ in range(pollers)]
+    threads += [threading.Thread(target=post) for _ in range(posters)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {
+        "get_rps": len(get_latencies) / seconds,
+        "get_p50_ms": percentile(get_latencies, 0.50) * 1000,
+        "get_p99_ms": percentile(get_latencies, 0.99) * 1000,
+        "post_p99_ms": percentile(post_latencies, 0.99) * 1000,
+        "errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest für den Status-Service")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pollers", type=int, default=4)
+    parser.add_argument("--posters", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    servers = {
+        "dev": make_dev_server("127.0.0.1", 0, status.app, threaded=True),
+        "pooled": make_server(status.app, "127.0.0.1", 0, threads=args.threads),
+    }
+
+    print(f"{'Server':8} {'GET req/s':>10} {'GET p50':>9} {'GET p99':>9} {'POST p99':>9} {'Fehler':>7}")
+    for name, server in servers.items():
+        t = threading.Thread(target=server.serve_forever, daemon=True)
+        t.start()
+        r = run_load(server.server_port, args.seconds, args.pollers, args.posters)
+        server.shutdown()
+        server.server_close()
+        print(f"{name:8} {r['get_rps']:10.0f} {r['get_p50_ms']:7.2f}ms {r['get_p99_ms']:7.2f}ms {r['post_p99_ms']:7.2f}ms {r['errors']:7}")
+
+    if status.reset_timer:
+        status.reset_timer.cancel()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,18 +8,23 @@ import logging
 import requests
 import io
 import json
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from spotipy.oauth2 import SpotifyClientCredentials
-from PIL import Image
-import spidev as SPI
 from pathlib import Path
 from dotenv import load_dotenv
-# Import display library (adjust if needed)
-from libs import LCD_1inch3
+from libs.image_store import ImageStore
+from libs.device_images import DeviceImageIndex
+from libs.frame_cache import FrameCache
+from libs.display_state import DisplayState
+from libs import image_select
+from libs import panel as panels_lib
+from libs import metrics
+from libs import logsetup
+from libs import spotify_auth
+from libs import circuit_breaker
+from libs import tracing
+from libs import profiler
+from contextlib import contextmanager
 import requests
 import threading
-import RPi.GPIO as GPIO
 
 from spotipy.exceptions import SpotifyException
 
@@ -28,63 +33,91 @@ code_patch = ""
 last_track_id = None
 last_spotify_call = 0
 rateLimitHitTime = 0
-
-# GPIO pin configuration
-RST = 27
-DC = 25
-BL = 18
-bus = 0
-device = 0
-# set GPIO to control backlight BL
-GPIO.setwarnings(False)
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(BL, GPIO.OUT)
-GPIO.output(BL, GPIO.HIGH)  # Start: on
+last_playback_key = None
+tap_trace = None  # (trace_id, timestamp) des letzten Taps laut Status-Service
+now_playing = None  # Titel/Fortschritt/Lautstärke für das Overlay (gemeinsam für alle Panels)
+lookups = {}  # Spotify-Abfragen des laufenden Updates, damit mehrere Panels sie nur einmal auslösen
+panels = []  # GPIO-/SPI-Konfiguration je Panel: config "panels", siehe libs/panel.py
+sp = None
+overlay_config = {}  # config.json beim letzten Spotify-Update (für die Overlay-Ticks alle 100 ms)
+background_started = False  # Exporter und Aufräum-Thread laufen (nur einmal je Prozess)
 
 cache_path = Path(__file__).resolve().parent / ".spotify_cache"
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+DISPLAY_STAGE = metrics.histogram("display_stage_seconds", "Dauer der Display-Pipeline-Schritte", ("stage",))
+
+@contextmanager
+def stage(name):
+    """Misst einen Pipeline-Schritt als Metrik und – bei aktivem Trace – als Span."""
+    with DISPLAY_STAGE.time(stage=name), tracing.span(name):
+        yield
+
+# Set up logging (Writer-Thread, Level per Web-UI umschaltbar)
+logsetup.setup("display")
 
-logging.getLogger("requests").setLevel(logging.WARNING)
-logging.getLogger("requests").propagate = True
-logging.getLogger("urllib3").setLevel(logging.WARNING)
-# Disable all child loggers of urllib3, e.g. urllib3.connectionpool
-logging.getLogger("urllib3").propagate = True
+# Eine Session für die Abfragen beim Status-Service (10x pro Sekunde); der Server schließt nach jeder Antwort
+status_session = requests.Session()
 
 def get_current_status():
+    global tap_trace
     try:
-        r = requests.get("http://127.0.0.1:5055/status", timeout=1)
-        return r.json().get("value", "playing")
+        with DISPLAY_STAGE.time(stage="status_poll"):
+            r = status_session.get("http://127.0.0.1:5055/status", timeout=1)
+        data = r.json()
+        if data.get("trace_id"):
+            tap_trace = (data["trace_id"], data.get("timestamp", time.time()))
+        return data.get("value", "playing")
     except:
         return "playing"
 
-def set_backlight(state: bool):
-    GPIO.output(BL, GPIO.HIGH if state else GPIO.LOW)
+def begin_playback_trace(playback, started, duration):
+    """Startet einen Trace, wenn sich die Wiedergabe geändert hat.
+
+    Liegt ein Tap kurz zurück, wird dessen Korrelations-ID übernommen, sodass
+    RFID-, Status- und Display-Spans in einem Trace landen.
+    """
+    global last_playback_key, tap_trace
+    item = (playback or {}).get("item") or {}
+    context = (playback or {}).get("context") or {}
+    device = (playback or {}).get("device") or {}
+    key = (item.get("id"), context.get("uri"), device.get("id"))
+    if key == last_playback_key:
+        return
+    last_playback_key = key
+
+    trace_id = None
+    if tap_trace and time.time() - tap_trace[1] < 30:
+        trace_id = tap_trace[0]
+        tracing.record("wait_for_poll", tap_trace[1], max(0.0, started - tap_trace[1]), trace_id)
+        tap_trace = None
+    trace_id = trace_id or tracing.new_trace_id()
+    tracing.set_trace_id(trace_id)
+    tracing.record("current_playback", started, duration, track=item.get("name"))
+
+def enter_idle():
+    """Nichts läuft: Sleep-Bild einmal zeigen, nach `sleepDelay` Sekunden die Panels schlafen legen.
+
+    Danach wird nichts mehr übertragen; das nächste angezeigte Bild (Status-
+    oder Wiedergabewechsel) weckt ein Panel über ShowFrame wieder auf.
+    """
+    delay = float(load_config().get("sleepDelay", 30))
+    for panel in panels:
+        if panel.sleeping:
+            continue
+        if panel.idle_since is None:
+            show_local_fallback("sleep.jpg", panel)
+            panel.idle_since = time.time()
+        elif time.time() - panel.idle_since > delay:
+            panel.sleep()
+            logging.info("💤 Keine Wiedergabe – Panel %s schläft.", panel.name)
+
+def leave_idle():
+    for panel in panels:
+        panel.idle_since = None
 
 def mapToImage(device):
     """Return local image path for a given Spotify device dict."""
-    device_id = device.get('id')
-    device_name = device.get('name', 'unknown').lower().replace(" ", "_")
-    
-    # Load mapping file (can be JSON or just file lookup)
-    images_dir = Path(__file__).resolve().parent / "static" / "images"
-    specific_path = images_dir / f"{device_id}.jpg"
-    fallback_path = images_dir / f"{device_name}.jpg"
-    default_path = images_dir / "default.jpg"
-
-    if specific_path.exists():
-        logging.debug(f"🔗 Found image for device ID: {device_id}")
-        return specific_path
-    elif fallback_path.exists():
-        logging.debug(f"🔗 Found image for device name: {device_name}")
-        return fallback_path
-    else:
-        logging.warning("🖼 No image found, using default.")
-        return default_path
+    return device_index.images_dir / f"{device_index.resolve(device)}.jpg"
 
 # Konfiguration laden
 def load_config():
@@ -95,85 +128,149 @@ def load_config():
             return json.load(f)
     return {"mode": "device"}# Konfiguration laden
     
-def show_device(image_path):
-    try:
-        from PIL import Image
-        image = Image.open(image_path).convert("RGB")
-        config = load_config()
-        rotation = int(config.get("rotation", 0))
-        if rotation != 0:
-            image = image.rotate(rotation, expand=True)
-        image = image.resize((disp.width, disp.height))
-        disp.ShowImage(image)
-    except Exception as e:
-        logging.error(f"Failed to load or display device image: {e}")
+def update_now_playing(playback):
+    """Merkt sich Titel, Fortschritt und Lautstärke für das Overlay (Fortschritt wird lokal fortgeschrieben)."""
+    global now_playing
+    item = playback.get("item") or {}
+    artists = ", ".join(a.get("name", "") for a in item.get("artists", []))
+    now_playing = {
+        "text": f"{item.get('name', '')} – {artists}" if artists else item.get("name", ""),
+        "progress_ms": playback.get("progress_ms") or 0,
+        "duration_ms": item.get("duration_ms"),
+        "is_playing": playback.get("is_playing", False),
+        "volume": (playback.get("device") or {}).get("volume_percent"),
+        "fetched": time.time(),
+    }
+    display_state.save_snapshot(now_playing)
+
+def show(panel, frame, live=True):
+    """Reiht einen Frame für ein Panel ein.
+
+    `live`: Cover bzw. Gerätebild der aktuellen Wiedergabe → mit Overlay und
+    dem konfigurierten Übergang (config "transition"). Status- und Fallback-
+    Bilder werden ohne beides sofort gezeigt.
+    """
+    config = load_config()
+    transition = None
+    if config.get("transition", "crossfade") != "none":
+        transition = {
+            "effect": config.get("transition", "crossfade"),
+            "duration": float(config.get("transitionMs", 300)) / 1000,
+            "fps": int(config.get("transitionFps", 30)),
+        }
+    with stage("show"):
+        panel.show(frame, live, now_playing if panel.wants_overlay(config) else None, transition)
+
+def overlay_tick():
+    """Aktualisiert die Overlays zwischen Spotify-Abfragen; übertragen werden nur geänderte Zeilen.
+
+    Liest config.json nicht selbst, sondern nutzt den Stand des letzten Spotify-Updates.
+    """
+    with DISPLAY_STAGE.time(stage="overlay"):
+        for panel in panels:
+            panel.tick(now_playing if panel.wants_overlay(overlay_config) else None)
+
+def set_offline(offline):
+    """Spotify nicht erreichbar: letztes Cover mit Offline-Plakette statt error.jpg (siehe libs/circuit_breaker.py)."""
+    config = load_config()
+    for panel in panels:
+        panel.set_offline(offline, now_playing if panel.wants_overlay(config) else None)
 
-def show_image_from_url(url, cache_name=None):
-    import requests, io
-    from PIL import Image
-    from pathlib import Path
+# RGB565-Umrechnung je Bildquelle: Cover (Fotos, Verläufe) mit Dithering, Gerätebilder ohne
+RGB565_MODES = {"covers": "dither", "devices": "plain"}
 
-    try:
-        config = load_config()
-        rotation = int(config.get("rotation", 0))
+def conversion_mode(source):
+    """Modus aus config "rgb565" (z. B. {"covers": "lut"}), sonst RGB565_MODES."""
+    return {**RGB565_MODES, **load_config().get("rgb565", {})}.get(source, "plain")
 
-        # Cache-Verzeichnis
-        cache_dir = Path(__file__).resolve().parent / "cache"
-        cache_dir.mkdir(parents=True, exist_ok=True)
+def apply_rotation():
+    """Übernimmt eine geänderte Rotation aus config.json per MADCTL; gecachte Frames bleiben gültig."""
+    config = load_config()
+    for panel in panels:
+        panel.apply_rotation(config)
 
-        # Cache-Dateiname
-        if cache_name:
-            cache_path = cache_dir / f"{cache_name}.jpg"
-        else:
-            # Fallback: nutze gehashte URL als Dateiname
-            import hashlib
-            hashname = hashlib.sha256(url.encode()).hexdigest()
-            cache_path = cache_dir / f"{hashname}.jpg"
+def lookup(key, fn, *args, **kwargs):
+    """Spotify-Abfrage höchstens einmal je Update – egal wie viele Panels das Ergebnis brauchen."""
+    if key not in lookups:
+        lookups[key] = fn(*args, **kwargs)
+    return lookups[key]
 
-        # Lade aus Cache oder von URL
-        if cache_path.exists():
-            logging.debug(f"🖼 Lade Bild aus Cache: {cache_path}")
-            image = Image.open(cache_path)
-        else:
-            logging.debug(f"🌐 Lade Bild von URL: {url}")
-            response = requests.get(url, timeout=5)
-            image = Image.open(io.BytesIO(response.content)).convert("RGB")
-            image.save(cache_path)
-            logging.debug(f"💾 Bild gespeichert unter: {cache_path}")
+def device_frame(image_path, panel):
+    """Frame eines lokalen Bildes (Gerät, Status, Fallback, gecachter Artist) für `panel`."""
+    try:
+        # Bilder aus static/images kommen fertig als Frame aus dem Index → ohne PIL aufs Display
+        if (panel.width, panel.height) == (device_index.width, device_index.height):
+            frame = device_index.frame(Path(image_path).stem)
+            if frame is not None:
+                return frame
+
+        with stage("decode"):
+            return frame_cache.get(str(image_path), panel.width, panel.height, conversion_mode("devices"), lambda: image_path)
+    except Exception as e:
+        logging.error("Failed to load or display device image: %s", e)
+        return None
 
-        # Rotation & Resize
-        if rotation != 0:
-            image = image.rotate(rotation, expand=True)
-        image = image.resize((disp.width, disp.height))
+def show_device(image_path, panel, live=True):
+    frame = device_frame(image_path, panel)
+    if frame is not None:
+        show(panel, frame, live)
 
-        # Anzeige
-        disp.ShowImage(image)
+def show_best_image(images, panel, cache_name=None):
+    """Zeigt die kleinste Variante einer Spotify-Bildliste an, die das Panel noch füllt."""
+    image = image_select.select_image(images, panel.width, panel.height)
+    show_image_from_url(image["url"], panel, cache_name, images=images)
 
+def show_image_from_url(url, panel, cache_name=None, images=None):
+    try:
+        frame = image_frame(url, panel, cache_name, images)
+        show(panel, frame)
     except Exception as e:
-        logging.error(f"❌ Fehler beim Anzeigen des Bildes von URL: {e}")
+        logging.error("❌ Fehler beim Anzeigen des Bildes von URL: %s", e)
+
+def image_frame(url, panel, cache_name=None, images=None):
+    """Frame eines Spotify-Bildes: Frame-Cache → Bild-Store → Download.
+
+    Der Frame-Cache wird von allen Panels geteilt; ein Cover, das bereits
+    angezeigt wird, kostet bei der nächsten Abfrage weder Download noch Dekodieren.
+    """
+    def source():
+        # Lookup im Index: zuerst über Entity-Schlüssel (z. B. a_<artistId>), dann über URL
+        path = image_store.lookup(cache_name) if cache_name else None
+        if path is None:
+            path = image_store.lookup(url)
+            if path is not None and cache_name:
+                image_store.link(cache_name, path)
 
-def cleanup_image_cache(days_old=3):
-    """Löscht Bilddateien aus dem Cache, die älter als `days_old` Tage sind."""
-    cache_dir = Path(__file__).resolve().parent / "cache"
-    if not cache_dir.exists():
-        logging.debug("🧹 Kein Cache-Verzeichnis vorhanden.")
-        return
+        # Lade aus Cache oder von URL
+        if path is not None:
+            logging.debug("🖼 Lade Bild aus Cache: %s", path)
+            return path
 
-    now = time.time()
-    cutoff = now - (days_old * 86400)  # 86400 Sekunden pro Tag
+        logging.debug("🌐 Lade Bild von URL: %s", url)
+        with stage("download"):
+            response = requests.get(url, timeout=5)
+        response.raise_for_status()
+        path = image_store.put(response.content, [url] + ([cache_name] if cache_name else []))
+        if images:
+            image_select.record_download(url, images, len(response.content))
+        logging.debug("💾 Bild gespeichert unter: %s", path)
+        return io.BytesIO(response.content)
 
-    deleted = 0
-    for file in cache_dir.glob("*.jpg"):
-        try:
-            if file.stat().st_mtime < cutoff:
-                file.unlink()
-                logging.info(f"🗑️  Alte Cache-Datei gelöscht: {file.name}")
-                deleted += 1
-        except Exception as e:
-            logging.warning(f"⚠️  Fehler beim Löschen von {file.name}: {e}")
+    # Dekodieren & Resize (die Rotation übernimmt der Display-Controller)
+    with stage("decode"):
+        return frame_cache.get(url, panel.width, panel.height, conversion_mode("covers"), source)
 
+def cleanup_image_cache(days_old=3):
+    """Entfernt Bilder aus dem Store, die seit `days_old` Tagen nicht genutzt wurden, und hält das Größenlimit ein."""
+    try:
+        deleted = image_store.evict(max_age_days=days_old)
+    except Exception as e:
+        logging.warning("⚠️  Fehler beim Aufräumen des Caches: %s", e)
+        return
+
+    stats = image_store.stats()
     if deleted > 0:
-        logging.info(f"✅ {deleted} Cache-Datei(en) entfernt.")
+        logging.info("✅ %s Cache-Datei(en) entfernt, %s Bilder / %s KB verbleiben.", deleted, stats['blobs'], stats['bytes'] // 1024)
     else:
         logging.debug("🧼 Keine veralteten Cache-Dateien gefunden.")
 
@@ -184,254 +281,317 @@ def start_cleanup_thread(interval_hours=6, days_old=3):
         while True:
             logging.debug("🧵 Starte Cache-Aufräum-Thread...")
             cleanup_image_cache(days_old=days_old)
-            logging.debug(f"🕒 Nächster Durchlauf in {interval_hours} Stunden.")
+            logging.debug("🕒 Nächster Durchlauf in %s Stunden.", interval_hours)
             time.sleep(interval_hours * 3600)
 
     t = threading.Thread(target=run, daemon=True)
     t.start()
-    logging.info(f"🚀 Hintergrund-Thread zum Cache-Aufräumen gestartet (alle {interval_hours}h).")
-
-def show_local_fallback(image_name):
-    fallback_path = Path(__file__).resolve().parent / "static/images" / image_name
-    if fallback_path.exists():
-        show_device(fallback_path)
-        logging.debug(f"🖼 Fallback-Bild angezeigt: {image_name}")
+    logging.info("🚀 Hintergrund-Thread zum Cache-Aufräumen gestartet (alle %sh).", interval_hours)
+
+def show_local_fallback(image_name, panel=None):
+    """Status- bzw. Fallback-Bild auf `panel` – ohne Angabe auf allen Panels."""
+    fallback_path = device_index.path(Path(image_name).stem)
+    if fallback_path is not None:
+        # Status- und Fallback-Bilder sofort zeigen (z. B. Rückmeldung beim Tap)
+        for target in [panel] if panel else panels:
+            show_device(fallback_path, target, live=False)
+        logging.debug("🖼 Fallback-Bild angezeigt: %s", image_name)
     else:
-        logging.warning(f"❌ Kein Fallback-Bild gefunden: {image_name}")
+        logging.warning("❌ Kein Fallback-Bild gefunden: %s", image_name)
 
-def show_artist_image(playback, artistId, fallback_mode="default"):
+def show_artist_image(playback, artistId, panel, fallback_mode="default"):
     global rateLimitHitTime
         
-    # Cache-Verzeichnis
-    cache_dir = Path(__file__).resolve().parent / "cache"
-    cache_dir.mkdir(parents=True, exist_ok=True)
-
-    # Cache-Dateiname
-    cache_path = cache_dir / f"a_{artistId}.jpg"
-
-    # Lade aus Cache oder von URL
-    if cache_path.exists():
-        logging.debug(f"🖼 Lade Artist-Bild aus Cache: {cache_path}")
-        image = Image.open(cache_path)
+    # Lade aus Cache
+    cache_path = image_store.lookup(f"a_{artistId}")
+    if cache_path is not None:
+        logging.debug("🖼 Lade Artist-Bild aus Cache: %s", cache_path)
+        show_device(cache_path, panel)
         return True
     
     # no cache image
     if (time.time()>rateLimitHitTime):
         try:
             artist_id = artistId
-            artist = sp.artist(artist_id)
+            artist = lookup(("artist", artist_id), sp.artist, artist_id)
             images = artist.get("images", [])
             if images:
-                show_image_from_url(images[0]["url"], f"a_{artistId}")
+                show_best_image(images, panel, f"a_{artistId}")
                 return True
         except SpotifyException as e:
-            if e.http_status == 429:
+            if circuit_breaker.is_outage(e):
+                logging.warning("⚠️ Spotify-Serverfehler beim Abrufen der Musiker-Daten: %s", e)
+            elif e.http_status == 429:
                 retry_after = int(e.headers.get("Retry-After", 5))
-                logging.warning(f"⚠️ Rate Limit! Warte {retry_after} Sekunden...")
+                logging.warning("⚠️ Rate Limit! Warte %s Sekunden...", retry_after)
                 rateLimitHitTime = time.time() + retry_after
             else:            
-                logging.error(f"❌ Fehler beim Abrufen der Musiker-Daten: {e}")        
+                logging.error("❌ Fehler beim Abrufen der Musiker-Daten: %s", e)        
         except Exception as e:
-            logging.warning(f"⚠️ Fehler beim direkten Artist-Zugriff: {e}")
+            logging.warning("⚠️ Fehler beim direkten Artist-Zugriff: %s", e)
     else:
-        logging.debug(f"Rate limit Zeit ist: {rateLimitHitTime} noch nicht erreicht.")
+        logging.debug("Rate limit Zeit ist: %s noch nicht erreicht.", rateLimitHitTime)
     
     # Fallback-Suche via aktuellem Track
     try:
         track = playback.get("item")
         if track:
             artist_name = track["artists"][0]["name"]
-            logging.debug(f"🔍 Artist-Fallback-Suche für '{artist_name}'")
-            search_result = sp.search(q=artist_name, type="artist", limit=1)
+            logging.debug("🔍 Artist-Fallback-Suche für '%s'", artist_name)
+            search_result = lookup(("search", artist_name), sp.search, q=artist_name, type="artist", limit=1)
             artists = search_result.get("artists", {}).get("items", [])
             if artists:
                 images = artists[0].get("images", [])
                 if images:
-                    show_image_from_url(images[0]["url"])
+                    show_best_image(images, panel, f"a_{artistId}")
                     return True
     except SpotifyException as e:
-        if e.http_status == 429:
+        if circuit_breaker.is_outage(e):
+            logging.warning("⚠️ Spotify-Serverfehler bei der Artist-Suche: %s", e)
+        elif e.http_status == 429:
             retry_after = int(e.headers.get("Retry-After", 5))
-            logging.warning(f"⚠️ Rate Limit! Warte {retry_after} Sekunden...")
+            logging.warning("⚠️ Rate Limit! Warte %s Sekunden...", retry_after)
             #time.sleep(retry_after)
         else:            
-            logging.error(f"❌ Fehler beim Lesen des Spotify-Kontexts: {e}")
+            logging.error("❌ Fehler beim Lesen des Spotify-Kontexts: %s", e)
             return False             
     except Exception as e:
-        logging.warning(f"⚠️ Fehler bei Artist-Suche: {e}")
+        logging.warning("⚠️ Fehler bei Artist-Suche: %s", e)
 
     # Zusätzlicher Fallback in "auto"-Modus: Albumcover
     if fallback_mode == "auto":
         item = playback.get("item")
         track_images = item.get("album", {}).get("images", []) if item else []
         if track_images:
-            show_image_from_url(track_images[0]["url"])
+            show_best_image(track_images, panel)
             return True
 
-    show_local_fallback("default_artist.jpg")
+    show_local_fallback("default_artist.jpg", panel)
     return False
     
 def process_spotify_update():    
-    config = load_config()
-    mode = config.get("displayMode", "device")
-    initialMode = mode
+    global overlay_config
+    config = overlay_config = load_config()
     try:
+        started, t0 = time.time(), time.perf_counter()
         playback = sp.current_playback()
+        set_offline(False)
+        begin_playback_trace(playback, started, time.perf_counter() - t0)
+        if playback:
+            update_now_playing(playback)
         if not playback:
             logging.debug("⏸ No playback available.")
-            show_local_fallback("sleep.jpg")
-            set_backlight(False)
-            return
-        else:
-            set_backlight(True)
-            
-        if mode == "delete":
-            show_local_fallback("delete.jpg")
+            enter_idle()
             return
+        leave_idle()
 
-        if mode == "auto":
-            context = playback.get("context", {})        
-            if not context:
-                logging.warning("⏸ No context available in auto.")
-                show_local_fallback("no_image.jpg")
-                return
-
-            context_type = context.get("type", "")
-            
-            if context_type:
-                mode = context_type
-
-        if mode == "device":
-            device = playback.get("device")
-            if device:
-                image_path = mapToImage(device)
-                show_device(image_path)
-            else:
-                show_local_fallback("default_device.jpg")
-
-        elif mode == "album":
-            item = playback.get("item")
-            
-            if not item:
-                logging.warning("⏸ playback item unavailable.")
-                show_local_fallback("no_image.jpg")
-                return
-                    
-            images = item.get("album", {}).get("images", []) if item else []
-            if images:
-                show_image_from_url(images[0]["url"])
-            else:
-                show_local_fallback("default_album.jpg")
-
-        elif mode == "playlist":
-            try:
-                context = playback.get("context", {})  
-                if not context:
-                    logging.warning("⏸ No context available in playlist.")
-                    show_local_fallback("no_image.jpg")
-                    return                
-                uri = context.get("uri", "")  
-                playlist_id = uri.split(":")[-1]
-                playlist = sp.playlist(playlist_id)
-                images = playlist.get("images", [])
-                if images:
-                    show_image_from_url(images[0]["url"])
-                else:
-                    show_local_fallback("default_playlist.jpg")
-                    raise Exception("No images in playlist")
-            except Exception as e:
-                logging.warning(f"⚠️ Fehler beim Playlist-Aufruf: {e}")
-                if initialMode == "auto":    
-                    item = playback.get("item")                    
-                    track_images = item.get("album", {}).get("images", []) if item else []
-                    if track_images:
-                        show_image_from_url(track_images[0]["url"])
-                    else:
-                        show_local_fallback("default_playlist.jpg")
-                else:
-                    show_local_fallback("default_playlist.jpg")
-
-        elif mode == "artist":
-            artistId = playback.get("item").get("album").get("artists")[0].get("id")  
-            show_artist_image(playback, artistId, fallback_mode="auto" if initialMode == "auto" else "default")
-        else:
-            logging.warning(f"❓ Unbekannter Modus: {mode}")
-            show_local_fallback("mode_unknown.jpg")
+        # Ein Wiedergabe-Snapshot für alle Panels; jedes rendert ihn in seinem eigenen Modus
+        lookups.clear()
+        for panel in panels:
+            with stage("render"):
+                render_panel(playback, panel.display_mode(config), panel)
 
+    except circuit_breaker.OUTAGE_ERRORS as e:
+        logging.debug("Spotify offline: %s", e)
+        set_offline(True)
     except SpotifyException as e:
-        if e.http_status == 429:
+        # Zuerst: spotipy meldet 5xx nach ausgeschöpften Retries als 429 („Max Retries“)
+        if circuit_breaker.is_outage(e):
+            logging.warning("⚠️ Spotify-Serverfehler: %s", e)
+            set_offline(True)
+        elif e.http_status == 429:
             retry_after = int(e.headers.get("Retry-After", 5))
-            logging.warning(f"⚠️ Rate Limit! Warte {retry_after} Sekunden...")
+            logging.warning("⚠️ Rate Limit! Warte %s Sekunden...", retry_after)
             show_local_fallback("ratelimit.jpg")
             time.sleep(retry_after)
         else:
-            logging.error(f"❌ Fehler in process_spotify_update(): {e}")
+            logging.error("❌ Fehler in process_spotify_update(): %s", e)
             show_local_fallback("error.jpg")
     except Exception as e:
-        logging.error(f"❌ Fehler in process_spotify_update(): {e}")
+        logging.error("❌ Fehler in process_spotify_update(): %s", e)
         show_local_fallback("error.jpg")
 
+def render_panel(playback, mode, panel):
+    """Zeigt die Wiedergabe auf einem Panel im Modus `mode` (device, album, playlist, artist, auto)."""
+    initialMode = mode
+    if mode == "delete":
+        show_local_fallback("delete.jpg", panel)
+        return
+
+    if mode == "auto":
+        context = playback.get("context", {})        
+        if not context:
+            logging.warning("⏸ No context available in auto.")
+            show_local_fallback("no_image.jpg", panel)
+            return
+
+        context_type = context.get("type", "")
+        
+        if context_type:
+            mode = context_type
+
+    if mode == "device":
+        device = playback.get("device")
+        if device:
+            image_path = mapToImage(device)
+            show_device(image_path, panel)
+        else:
+            show_local_fallback("default_device.jpg", panel)
+
+    elif mode == "album":
+        item = playback.get("item")
+        
+        if not item:
+            logging.warning("⏸ playback item unavailable.")
+            show_local_fallback("no_image.jpg", panel)
+            return
+                
+        images = item.get("album", {}).get("images", []) if item else []
+        if images:
+            show_best_image(images, panel)
+        else:
+            show_local_fallback("default_album.jpg", panel)
+
+    elif mode == "playlist":
+        try:
+            context = playback.get("context", {})  
+            if not context:
+                logging.warning("⏸ No context available in playlist.")
+                show_local_fallback("no_image.jpg", panel)
+                return                
+            uri = context.get("uri", "")  
+            playlist_id = uri.split(":")[-1]
+            playlist = lookup(("playlist", playlist_id), sp.playlist, playlist_id)
+            images = playlist.get("images", [])
+            if images:
+                show_best_image(images, panel)
+            else:
+                show_local_fallback("default_playlist.jpg", panel)
+                raise Exception("No images in playlist")
+        except Exception as e:
+            logging.warning("⚠️ Fehler beim Playlist-Aufruf: %s", e)
+            if initialMode == "auto":    
+                item = playback.get("item")                    
+                track_images = item.get("album", {}).get("images", []) if item else []
+                if track_images:
+                    show_best_image(track_images, panel)
+                else:
+                    show_local_fallback("default_playlist.jpg", panel)
+            else:
+                show_local_fallback("default_playlist.jpg", panel)
+
+    elif mode == "artist":
+        artistId = playback.get("item").get("album").get("artists")[0].get("id")  
+        show_artist_image(playback, artistId, panel, fallback_mode="auto" if initialMode == "auto" else "default")
+    else:
+        logging.warning("❓ Unbekannter Modus: %s", mode)
+        show_local_fallback("mode_unknown.jpg", panel)
+
 def process_once():
     try:
         global last_spotify_call
         status = get_current_status()
             
+        shown = None
         while (status != "playing"):
-            show_local_fallback(f"{status}.jpg")
+            # Nur bei Statuswechsel neu zeichnen
+            if status != shown:
+                leave_idle()
+                show_local_fallback(f"{status}.jpg")
+                shown = status
+            time.sleep(0.100)
             status = get_current_status()
         
         if time.time() - last_spotify_call > 5:
-            logging.debug(f"processing spotify update...")
-            process_spotify_update()
+            logging.debug("processing spotify update...")
+            apply_rotation()
+            with DISPLAY_STAGE.time(stage="update"):
+                process_spotify_update()
+            tracing.set_trace_id(None)
             last_spotify_call = time.time()
         else:
-            logging.debug(f"waiting for next processing time...")
+            logging.debug("waiting for next processing time...")
+        overlay_tick()
     except Exception as e:
-        logging.error(f"❌ Fehler in process_once(): {e}")
+        logging.error("❌ Fehler in process_once(): %s", e)
         show_local_fallback("error.jpg")
         
-# Initialize display
-disp = LCD_1inch3.LCD_1inch3(
-    spi=SPI.SpiDev(bus, device),
-    spi_freq=10000000,
-    rst=RST,
-    dc=DC,
-    bl=BL
-)
-disp.Init()
-disp.clear()
-
-config = load_config()
-
-# Spotify auth
-try:
-    auth_manager = SpotifyOAuth(
-        client_id=config.get("client_id"),
-        client_secret=config.get("client_secret"),
-        redirect_uri=config.get("redirect_uri"),
-        scope="user-read-playback-state user-modify-playback-state user-read-private user-read-email",
-        cache_path=Path(__file__).resolve().parent / ".spotify_cache",
-        open_browser=False
-    )
-    
-    auth_manager_cc = SpotifyClientCredentials(
-        client_id=config.get("client_id"),
-        client_secret=config.get("client_secret")
+def setup(standalone=True, images=None):
+    """Richtet Panels, Caches, Spotify-Client und Hintergrund-Threads ein.
+
+    Mehrfacher Aufruf ist harmlos: Startet der Supervisor (musiccontrol.py)
+    den Dienst nach einem Absturz neu, bleiben Panels, Client und Threads
+    bestehen, statt ein zweites Mal angelegt zu werden.
+    """
+    global sp, background_started
+
+    config = load_config()
+    if not panels:
+        setup_panels(config, images)
+
+    # Spotify auth
+    if sp is None:
+        try:
+            # Gemeinsamer Token-Cache mit Sperre; erneuert das Token im Hintergrund vor Ablauf
+            sp = spotify_auth.create_spotify(
+                config,
+                requests_timeout=10,
+                retries=0,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        except Exception as e:
+            logging.error("❌ Spotify Auth fehlgeschlagen: %s", e)
+            exit(1)
+
+    if not background_started:
+        metrics.start_socket_exporter(Path(__file__).resolve().parent / "run" / "display.sock")
+        if standalone:
+            tracing.start_exporter("display")
+            profiler.install_signal_handler("display")
+        start_cleanup_thread(interval_hours=6, days_old=90)
+        background_started = True
+
+
+def setup_panels(config, images=None):
+    """Panels, Bild-Indizes und Caches anlegen; das letzte Bild steht danach schon auf dem Display."""
+    global panels, device_index, image_store, frame_cache, display_state, now_playing
+
+    # Letztes Bild und Wiedergabe-Snapshot vor jedem Netzwerkzugriff zeigen;
+    # die erste Live-Abfrage gleicht danach ab (gleiches Cover → keine Übertragung)
+    display_state = DisplayState(Path(__file__).resolve().parent / "cache" / "display")
+    now_playing = display_state.load_snapshot()
+
+    # Panels initialisieren (ohne config "panels": ein Display an SPI 0.0 wie bisher)
+    with DISPLAY_STAGE.time(stage="init"):
+        panels = panels_lib.create_panels(config, display_state, now_playing)
+
+    device_index = images or DeviceImageIndex(
+        Path(__file__).resolve().parent / "static" / "images",
+        width=panels[0].width,
+        height=panels[0].height
     )
 
-    sp = spotipy.Spotify(
-        auth_manager=auth_manager,
-        requests_timeout=10,
-        retries=0,
-        status_forcelist=[500, 502, 503, 504]
+    image_store = ImageStore(
+        Path(__file__).resolve().parent / "cache",
+        max_bytes=int(config.get("imageCacheMB", 50)) * 1024 * 1024
     )
-except Exception as e:
-    logging.error(f"❌ Spotify Auth fehlgeschlagen: {e}")
-    exit(1)
+    frame_cache = FrameCache(max_frames=8 * len(panels))
+
+
+def main(standalone=True, images=None):
+    """Startet den Display-Dienst.
+
+    `standalone=False` (All-in-one, musiccontrol.py): ohne Signal-Handler und
+    Trace-Export, die übernimmt der Supervisor. `images`: ein bereits
+    vorhandener DeviceImageIndex (z. B. der des Web-Service) statt eines eigenen.
+    """
+    setup(standalone, images)
+
+    # Normal loop mode
+    while True:
+        process_once()
+        time.sleep(0.100)
 
-start_cleanup_thread(interval_hours=6, days_old=90)
 
-# Normal loop mode
-while True:
-    process_once()
-    time.sleep(0.100)
+if __name__ == "__main__":
+    main()
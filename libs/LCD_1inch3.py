@@ -1,16 +1,65 @@
 
 import time
 from . import lcdconfig
+from . import rgb565
 
 class LCD_1inch3(lcdconfig.RaspberryPi):
 
     width = 240
     height = 240 
-    def command(self, cmd):
-        self.digital_write(self.DC_PIN, self.GPIO.LOW)
-        self.spi_writebyte([cmd])      
+    sleeping = False
+    rotation = 0
+    x_offset = 0
+    y_offset = 0
+
+    # Rotation (counter-clockwise, like Image.rotate) -> MADCTL value and
+    # column/row offset into the 240x320 GRAM of the ST7789
+    MADCTL = {
+        0:   (0x70, 0, 0),
+        90:  (0x00, 0, 0),
+        180: (0xA0, 80, 0),
+        270: (0xC0, 0, 80),
+    }
+
+    # Init sequence as (command, parameters); each entry is sent as one
+    # command byte plus one SPI transaction for all of its parameters
+    INIT_SEQUENCE = (
+        (0x3A, b"\x05"),
+        (0xB2, b"\x0C\x0C\x00\x33\x33"),
+        (0xB7, b"\x35"),
+        (0xBB, b"\x19"),
+        (0xC0, b"\x2C"),
+        (0xC2, b"\x01"),
+        (0xC3, b"\x12"),
+        (0xC4, b"\x20"),
+        (0xC6, b"\x0F"),
+        (0xD0, b"\xA4\xA1"),
+        (0xE0, b"\xD0\x04\x0D\x11\x13\x2B\x3F\x54\x4C\x18\x0D\x0B\x1F\x23"),
+        (0xE1, b"\xD0\x04\x0C\x11\x13\x2C\x3F\x44\x51\x2F\x1F\x1F\x20\x23"),
+        (0x21, b""),
+        (0x11, b""),
+        (0x29, b""),
+    )
+
+    _dc = None
+    _fill_cache = None
+
+    def _set_dc(self, level):
+        """Toggle the DC pin only when its level actually changes"""
+        if self._dc != level:
+            self.digital_write(self.DC_PIN, level)
+            self._dc = level
+
+    def command(self, cmd, params=b""):
+        """Send a command byte followed by all of its parameters in one transaction"""
+        self._set_dc(self.GPIO.LOW)
+        self.spi_writebyte([cmd])
+        if params:
+            self._set_dc(self.GPIO.HIGH)
+            self.spi_writebuffer(bytes(params))
+
     def data(self, val):
-        self.digital_write(self.DC_PIN, self.GPIO.HIGH)
+        self._set_dc(self.GPIO.HIGH)
         self.spi_writebyte([val])
 
     def reset(self):
@@ -21,103 +70,38 @@ class LCD_1inch3(lcdconfig.RaspberryPi):
         time.sleep(0.01)
         self.GPIO.output(self.RST_PIN,self.GPIO.HIGH)
         time.sleep(0.01)
-    def Init(self):
-        """Initialize dispaly"""  
-        self.module_init()
-        self.reset()
-
-        self.command(0x36)
-        self.data(0x70)                 #self.data(0x00)
-
-        self.command(0x3A) 
-        self.data(0x05)
-
-        self.command(0xB2)
-        self.data(0x0C)
-        self.data(0x0C)
-        self.data(0x00)
-        self.data(0x33)
-        self.data(0x33)
-
-        self.command(0xB7)
-        self.data(0x35) 
-
-        self.command(0xBB)
-        self.data(0x19)
-
-        self.command(0xC0)
-        self.data(0x2C)
-
-        self.command(0xC2)
-        self.data(0x01)
-
-        self.command(0xC3)
-        self.data(0x12)   
-
-        self.command(0xC4)
-        self.data(0x20)
-
-        self.command(0xC6)
-        self.data(0x0F) 
-
-        self.command(0xD0)
-        self.data(0xA4)
-        self.data(0xA1)
-
-        self.command(0xE0)
-        self.data(0xD0)
-        self.data(0x04)
-        self.data(0x0D)
-        self.data(0x11)
-        self.data(0x13)
-        self.data(0x2B)
-        self.data(0x3F)
-        self.data(0x54)
-        self.data(0x4C)
-        self.data(0x18)
-        self.data(0x0D)
-        self.data(0x0B)
-        self.data(0x1F)
-        self.data(0x23)
-
-        self.command(0xE1)
-        self.data(0xD0)
-        self.data(0x04)
-        self.data(0x0C)
-        self.data(0x11)
-        self.data(0x13)
-        self.data(0x2C)
-        self.data(0x3F)
-        self.data(0x44)
-        self.data(0x51)
-        self.data(0x2F)
-        self.data(0x1F)
-        self.data(0x1F)
-        self.data(0x20)
-        self.data(0x23)
-        
-        self.command(0x21)
 
-        self.command(0x11)
+    def Init(self, reset=True):
+        """Initialize dispaly (reset=False if the RST line is shared and was already pulsed)"""  
+        self.module_init()
+        self._dc = None
+        if reset:
+            self.reset()
 
-        self.command(0x29)
+        self.set_rotation(self.rotation)
+        for cmd, params in self.INIT_SEQUENCE:
+            self.command(cmd, params)
   
+    def set_rotation(self, rotation):
+        """Rotate in hardware by programming MADCTL; frames are always sent unrotated"""
+        rotation = int(rotation) % 360
+        if rotation not in self.MADCTL:
+            raise ValueError('Rotation must be one of {0}.'.format(sorted(self.MADCTL)))
+        madctl, self.x_offset, self.y_offset = self.MADCTL[rotation]
+        self.command(0x36, [madctl])
+        self.rotation = rotation
+
     def SetWindows(self, Xstart, Ystart, Xend, Yend):
-        #set the X coordinates
-        self.command(0x2A)
-        self.data(0x00)               #Set the horizontal starting point to the high octet
-        self.data(Xstart & 0xff)      #Set the horizontal starting point to the low octet
-        self.data(0x00)               #Set the horizontal end to the high octet
-        self.data((Xend - 1) & 0xff) #Set the horizontal end to the low octet 
-        
-        #set the Y coordinates
-        self.command(0x2B)
-        self.data(0x00)
-        self.data((Ystart & 0xff))
-        self.data(0x00)
-        self.data((Yend - 1) & 0xff )
-
-        self.command(0x2C) 
+        Xstart += self.x_offset
+        Xend += self.x_offset - 1
+        Ystart += self.y_offset
+        Yend += self.y_offset - 1
+
+        # set the X and Y coordinates (start/end as 16-bit big endian)
+        self.command(0x2A, [Xstart >> 8, Xstart & 0xff, Xend >> 8, Xend & 0xff])
+        self.command(0x2B, [Ystart >> 8, Ystart & 0xff, Yend >> 8, Yend & 0xff])
+
+        self.command(0x2C)
         
     def ShowImage(self,Image):
         """Set buffer to value of Python Imaging Library image."""
@@ -126,22 +110,56 @@ class LCD_1inch3(lcdconfig.RaspberryPi):
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).' .format(self.width, self.height))
-        img = self.np.asarray(Image)
-        pix = self.np.zeros((self.width,self.height,2), dtype = self.np.uint8)
-        pix[...,[0]] = self.np.add(self.np.bitwise_and(img[...,[0]],0xF8),self.np.right_shift(img[...,[1]],5))
-        pix[...,[1]] = self.np.add(self.np.bitwise_and(self.np.left_shift(img[...,[1]],3),0xE0),self.np.right_shift(img[...,[2]],3))
-        pix = pix.flatten().tolist()
+        self.ShowFrame(rgb565.to_rgb565(Image))
+
+    def ShowFrame(self, frame):
+        """Write a pre-converted RGB565 (big endian) frame buffer to the display"""
+        if len(frame) != rgb565.frame_size(self.width, self.height):
+            raise ValueError('Frame must be {0} bytes.'.format(rgb565.frame_size(self.width, self.height)))
         self.SetWindows ( 0, 0, self.width, self.height)
-        self.digital_write(self.DC_PIN,self.GPIO.HIGH)
-        for i in range(0,len(pix),4096):
-            self.spi_writebyte(pix[i:i+4096])		
-        
+        self._set_dc(self.GPIO.HIGH)
+        self.spi_writebuffer(frame)
+        # Der GRAM wird auch im Sleep-Modus beschrieben → erst mit dem neuen Bild aufwachen
+        self.wake()
+
+    def ShowRows(self, rows, Ystart, Yend):
+        """Write full-width rows [Ystart, Yend) of a RGB565 (big endian) frame"""
+        if len(rows) != rgb565.frame_size(self.width, Yend - Ystart):
+            raise ValueError('Rows must be {0} bytes.'.format(rgb565.frame_size(self.width, Yend - Ystart)))
+        self.SetWindows ( 0, Ystart, self.width, Yend)
+        self._set_dc(self.GPIO.HIGH)
+        self.spi_writebuffer(rows)
+        self.wake()
+
+    def sleep(self):
+        """Display off + sleep in; backlight PWM off. Content stays in GRAM."""
+        if self.sleeping:
+            return
+        self.bl_DutyCycle(0)
+        self.command(0x28)  # DISPOFF
+        self.command(0x10)  # SLPIN
+        time.sleep(0.005)   # ST7789: 5 ms until the next command
+        self.sleeping = True
+
+    def wake(self):
+        """Sleep out + display on; backlight back to full duty."""
+        if not self.sleeping:
+            return
+        self.command(0x11)  # SLPOUT
+        time.sleep(0.120)   # ST7789: 120 ms after SLPOUT
+        self.command(0x29)  # DISPON
+        self.bl_DutyCycle(100)
+        self.sleeping = False
+
+    def fill(self, color):
+        """Fill the whole display with one RGB565 color from a cached, pre-filled buffer"""
+        if self._fill_cache is None:
+            self._fill_cache = {}
+        frame = self._fill_cache.get(color)
+        if frame is None:
+            frame = self._fill_cache[color] = color.to_bytes(2, "big") * (self.width * self.height)
+        self.ShowFrame(frame)
+
     def clear(self):
         """Clear contents of image buffer"""
-        _buffer = [0xff]*(self.width * self.height * 2)
-        self.SetWindows ( 0, 0, self.width, self.height)
-        self.digital_write(self.DC_PIN,self.GPIO.HIGH)
-        for i in range(0,len(_buffer),4096):
-            self.spi_writebyte(_buffer[i:i+4096])	        
-        
-
+        self.fill(0xFFFF)
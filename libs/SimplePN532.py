@@ -3,16 +3,28 @@
 import board
 import busio
 import logging
+import time
+import zlib
 from digitalio import DigitalInOut
 from adafruit_pn532.i2c import PN532_I2C
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+from libs import metrics
+
+TAG_STAGE = metrics.histogram("rfid_tag_seconds", "Dauer der Tag-Operationen", ("stage",))
+
+EMPTY_PAGE = b"\x00\x00\x00\x00"
+# Kennung der Prüfsummenseite (Magic + Layout-Version); alles andere dort sind Altlasten, z. B. NDEF-Reste
+CHECKSUM_MAGIC = b"\xc5\x01"
 
 class SimplePN532:
+    """Liest/schreibt ASCII-Text in die Seiten ab `start_block` eines NTAG2xx.
+
+    Layout: `block_count` Datenseiten, die erste ist der Header (alle Nullen =
+    leerer bzw. gelöschter Tag), dahinter eine Prüfsummenseite: CHECKSUM_MAGIC
+    und die unteren 16 Bit des CRC32 der Datenseiten. Ohne Magic (alter Tag,
+    Reste früherer Inhalte) wird nicht geprüft.
+    """
+
     def __init__(self, start_block=4, block_count=12, debug=False):
         """Initialisiert die PN532-Kommunikation via I2C."""
         self.i2c = busio.I2C(board.SCL, board.SDA)
@@ -20,45 +32,166 @@ class SimplePN532:
         self.pn532.SAM_configuration()
         self.start_block = start_block
         self.block_count = block_count  # Standard: 12 Blöcke × 4 Byte = 48 Byte
+        self.checksum_block = start_block + block_count
+
+        # Zuletzt gelesener Tag: Das Target bleibt selektiert, Schreiben braucht kein neues Erkennen
+        self._uid = None
+        self._pages = None      # bekannter Inhalt je Datenseite (None = unbekannt)
+        self._checksum = None
+
+    @staticmethod
+    def checksum(padded):
+        """Inhalt der Prüfsummenseite für die (aufgefüllten) Datenseiten."""
+        return CHECKSUM_MAGIC + (zlib.crc32(padded) & 0xFFFF).to_bytes(2, "big")
+
+    def _verify_pages(self, expected):
+        """Liest die Seiten aus `expected` ({Seite: Inhalt}) zurück, je READ bis zu 4 auf einmal."""
+        remaining = sorted(expected)
+        while remaining:
+            first = remaining[0]
+            chunk = self._read_chunk(first)
+            if chunk is None:
+                return False
+            for page in [p for p in remaining if p < first + 4]:
+                offset = (page - first) * 4
+                if chunk[offset:offset + 4] != expected[page]:
+                    return False
+                remaining.remove(page)
+        return True
+
+    def _read_chunk(self, block):
+        """Liest mit einem READ-Kommando 4 Seiten (16 Byte) ab `block`; bis zu 10 Versuche."""
+        for retry in range(10):
+            try:
+                chunk = self.pn532.mifare_classic_read_block(block)
+            except Exception:
+                chunk = None
+            if chunk is not None:
+                return bytes(chunk)
+        return None
+
+    def _write_page(self, block, data):
+        try:
+            return self.pn532.ntag2xx_write_block(block, data)
+        except Exception:
+            return False
+
+    def _select(self, uid, timeout):
+        """Verwendet das noch selektierte Target weiter oder erkennt den Tag neu."""
+        if uid is not None and uid == self._uid:
+            return uid
+        uid = self.pn532.read_passive_target(timeout=timeout)
+        self._uid = uid
+        self._pages = None
+        self._checksum = None
+        return uid
 
     def read_tag(self, timeout=0.5, strict=False):
         successful = True
+        start = time.perf_counter()
         uid = self.pn532.read_passive_target(timeout=timeout)
+        self._uid = uid
+        self._pages = None
+        self._checksum = None
         if not uid:
             return None, None, True
+        TAG_STAGE.observe(time.perf_counter() - start, stage="detect")
 
-        data = bytearray()
-        for i in range(self.block_count):
-            for retry in range(10):
-                block = self.pn532.ntag2xx_read_block(self.start_block + i)
-                if block is not None:
-                    break
-            else:
-                block = None  # Alle 10 Versuche fehlgeschlagen
+        start = time.perf_counter()
+        pages = [None] * self.block_count
+        for offset in range(0, self.block_count, 4):
+            chunk = self._read_chunk(self.start_block + offset)
+            if chunk is None:
+                if strict:
+                    return uid, None, False
+                successful = False
+                logging.warning("⚠️ Block %s konnte nicht gelesen werden.", self.start_block + offset)
+                continue
+            for j in range(min(4, self.block_count - offset)):
+                pages[offset + j] = chunk[j * 4:(j + 1) * 4]
+
+            if offset == 0 and pages[0] == EMPTY_PAGE:
+                # Header leer → Tag ist leer bzw. gelöscht, der Rest muss nicht gelesen werden
+                self._pages = pages
+                TAG_STAGE.observe(time.perf_counter() - start, stage="read")
+                return uid, "", True
 
-            if block is None:
+        data = b"".join(page if page is not None else EMPTY_PAGE for page in pages)
+        if successful:
+            self._pages = pages
+            chunk = self._read_chunk(self.checksum_block)
+            self._checksum = chunk[:4] if chunk is not None else None
+            has_magic = self._checksum is not None and self._checksum.startswith(CHECKSUM_MAGIC)
+            if has_magic and self._checksum != self.checksum(data):
+                logging.warning("⚠️ Prüfsumme des Tags stimmt nicht.")
                 if strict:
                     return uid, None, False
                 successful = False
-                logging.warning(f"⚠️ Block {self.start_block + i} konnte nicht gelesen werden.")
-                data.extend(b"\x00\x00\x00\x00")
-            else:
-                data.extend(block)
 
+        TAG_STAGE.observe(time.perf_counter() - start, stage="read")
         return uid, data.rstrip(b"\x00").decode("ascii", errors="replace"), successful
 
-    def write_tag(self, text, timeout=0.5):
-        """Schreibt einen ASCII-Text auf das Tag. Rückgabe: (UID, success:bool)"""
-        uid = self.pn532.read_passive_target(timeout=timeout)
+    def write_tag(self, text, uid=None, timeout=0.5):
+        """Schreibt einen ASCII-Text auf das Tag. Rückgabe: (UID, success:bool)
+
+        Mit `uid` des gerade gelesenen Tags entfällt das erneute Erkennen. Es
+        werden nur Seiten geschrieben, die sich vom bekannten Inhalt
+        unterscheiden; der Header zuletzt, damit ein abgebrochener Schreibvorgang
+        einen leeren statt eines halb beschriebenen Tags hinterlässt.
+
+        Verifiziert wird bewusst nicht allein über die Prüfsummenseite – die
+        belegt nur, dass sie selbst geschrieben wurde, nichts über die Daten.
+        Zurückgelesen werden stattdessen genau die in diesem Aufruf
+        geschriebenen Seiten (inkl. Prüfsummenseite), gebündelt zu READs à 4
+        Seiten; unveränderte Seiten sind aus dem vorherigen Lesen bekannt. Bei
+        einer Titeländerung sind das meist ein bis zwei statt vier READs.
+        """
+        uid = self._select(uid, timeout)
         if not uid:
             return None, False
 
         encoded = text.encode("ascii")[:self.block_count * 4]
         padded = encoded.ljust(self.block_count * 4, b"\x00")
+        pages = [padded[i * 4:(i + 1) * 4] for i in range(self.block_count)]
+        checksum = self.checksum(padded)
+        known = self._pages or [None] * self.block_count
+        written = {}  # Seite → geschriebener Inhalt (zum Zurücklesen)
+
+        with TAG_STAGE.time(stage="write"):
+            for i in list(range(1, self.block_count)) + [0]:
+                if i == 0 and self._checksum != checksum:
+                    # Ohne Platz für die Prüfsummenseite (z. B. Ultralight) zählen allein die Daten
+                    if self._write_page(self.checksum_block, checksum):
+                        written[self.checksum_block] = checksum
+                        self._checksum = checksum
+                    else:
+                        self._checksum = None
+                if known[i] == pages[i]:
+                    continue
+                if not self._write_page(self.start_block + i, pages[i]):
+                    self._pages = None
+                    return uid, False
+                known[i] = pages[i]
+                written[self.start_block + i] = pages[i]
+            self._pages = known
+
+        with TAG_STAGE.time(stage="verify"):
+            verified = self._verify_pages(written)
+        if not verified:
+            self._pages = None
+        return uid, verified
+
+    def erase_tag(self, uid=None, timeout=0.5):
+        """Löscht den Tag, indem nur der Header ungültig gemacht wird. Rückgabe: (UID, success:bool)"""
+        uid = self._select(uid, timeout)
+        if not uid:
+            return None, False
 
-        for i in range(self.block_count):
-            block_data = padded[i*4:(i+1)*4]
-            success = self.pn532.ntag2xx_write_block(self.start_block + i, block_data)
-            if not success:
+        with TAG_STAGE.time(stage="erase"):
+            if not self._write_page(self.start_block, EMPTY_PAGE):
                 return uid, False
-        return uid, True
+            chunk = self._read_chunk(self.start_block)
+        erased = chunk is not None and chunk[:4] == EMPTY_PAGE
+        if self._pages is not None:
+            self._pages[0] = EMPTY_PAGE if erased else None
+        return uid, erased
@@ -0,0 +1,276 @@
+# circuit_breaker.py
+
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+import requests
+from spotipy.exceptions import SpotifyException
+
+from libs import metrics
+
+STATE_PATH = Path(__file__).resolve().parent.parent / "run" / "spotify_breaker.json"
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Wartezeiten zwischen zwei Probe-Aufrufen, solange Spotify nicht erreichbar ist
+BACKOFF = (5, 10, 20, 40, 60)  # Sekunden
+
+CIRCUIT_STATE = metrics.gauge("spotify_circuit_state", "Circuit Breaker für Spotify (0 = closed, 1 = half-open, 2 = open)")
+CIRCUIT_REJECTED = metrics.counter("spotify_circuit_rejected_total", "Ohne Netzwerkzugriff abgewiesene Spotify-Aufrufe")
+CIRCUIT_PROBES = metrics.counter("spotify_circuit_probes_total", "Probe-Aufrufe bei offenem Circuit Breaker", ("result",))
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Spotify gilt als nicht erreichbar; der Aufruf wurde ohne Netzwerkzugriff abgewiesen."""
+
+
+# Fehler, die auf fehlende Verbindung statt auf einen fehlerhaften Aufruf hindeuten
+OUTAGE_ERRORS = (CircuitOpenError, requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+def is_outage(exc):
+    """True bei Verbindungsfehlern, Timeouts, abgewiesenen Aufrufen und 5xx-Antworten.
+
+    Alle Clients laufen mit retries=0 und 5xx in status_forcelist: Ein 5xx
+    kommt damit als spotipy-„Max Retries“ an, also als 429 ohne Antwort-
+    Header, und zählt als Ausfall. Ein echtes Rate-Limit (429 nicht in der
+    forcelist) kommt dagegen mit Headern und Retry-After.
+    """
+    if isinstance(exc, OUTAGE_ERRORS):
+        return True
+    if isinstance(exc, SpotifyException):
+        if exc.http_status == 429:
+            return not (exc.headers or {}).get("Retry-After")
+        return exc.http_status is not None and exc.http_status >= 500
+    return False
+
+
+class CircuitBreaker:
+    """Circuit Breaker für Spotify, dessen Zustand display, rfid und web über eine Datei teilen.
+
+    closed     Aufrufe laufen normal; `failure_threshold` Ausfälle in Folge öffnen ihn.
+    open       Aufrufe werfen sofort CircuitOpenError statt 10 s auf einen Timeout zu warten.
+    half_open  Ein Prozess prüft per günstigem Probe-Aufruf, ob Spotify wieder erreichbar ist;
+               Erfolg schließt den Breaker, ein Fehlschlag öffnet ihn mit der nächsten
+               Wartezeit aus BACKOFF.
+
+    Gelesen wird die Zustandsdatei nur bei geänderter mtime; geschrieben wird
+    nur bei Zustandswechseln und Fehlern, atomar unter Dateisperre.
+    """
+
+    def __init__(self, path=STATE_PATH, failure_threshold=3, backoff=BACKOFF, probe_timeout=30):
+        self.path = Path(path)
+        self.lock_path = Path(str(path) + ".lock")
+        self.failure_threshold = failure_threshold
+        self.backoff = backoff
+        self.probe_timeout = probe_timeout
+
+        self._lock = threading.RLock()
+        self._state = self._initial()
+        self._mtime = None
+        self._prober = None
+
+    @staticmethod
+    def _initial():
+        return {"state": CLOSED, "failures": 0, "attempt": 0, "next_probe": 0.0}
+
+    # --- Zustandsdatei ------------------------------------------------------
+
+    def _read(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._state, self._mtime = self._initial(), None
+            return self._state
+        if mtime != self._mtime:
+            try:
+                self._state = {**self._initial(), **json.loads(self.path.read_text())}
+            except (OSError, ValueError):
+                self._state = self._initial()
+            self._mtime = mtime
+            CIRCUIT_STATE.set(_STATE_VALUES.get(self._state["state"], 0))
+        return self._state
+
+    def _write(self, state):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.path)
+        self._state = state
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def _update(self, change):
+        """Liest den Zustand unter Sperre neu, wendet `change` an und schreibt ihn bei Änderung."""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._mtime = None
+                state = dict(self._read())
+                new = change(dict(state))
+                if new is not None and new != state:
+                    self._write(new)
+                    CIRCUIT_STATE.set(_STATE_VALUES[new["state"]])
+                return self._state
+
+    # --- Abfrage ------------------------------------------------------------
+
+    @property
+    def state(self):
+        with self._lock:
+            state = self._read()
+        if state["state"] == HALF_OPEN and time.time() - state.get("probe_started", 0) > self.probe_timeout:
+            return OPEN  # Probe-Prozess hängt oder ist abgestürzt
+        return state["state"]
+
+    def allow_request(self):
+        return self.state == CLOSED
+
+    def healthy(self):
+        """Geschlossen und seit dem letzten Erfolg ohne Fehler – sicher genug, um Aufgeschobenes nachzuholen."""
+        with self._lock:
+            state = self._read()
+        return state["state"] == CLOSED and state["failures"] == 0
+
+    # --- Ergebnisse ---------------------------------------------------------
+
+    def record_success(self):
+        with self._lock:
+            state = self._read()
+        if state["state"] == CLOSED and state["failures"] == 0:
+            return  # Normalfall: nur ein stat(), kein Schreiben
+
+        def change(state):
+            if state["state"] != CLOSED:
+                logging.info("🟢 Spotify wieder erreichbar – Circuit Breaker geschlossen.")
+            return self._initial()
+        self._update(change)
+
+    def record_failure(self):
+        def change(state):
+            state["failures"] += 1
+            if state["state"] == CLOSED and state["failures"] >= self.failure_threshold:
+                logging.warning("🔴 Spotify nicht erreichbar (%s Fehler) – Circuit Breaker offen.", state['failures'])
+                return self._open(state, 0)
+            return state
+        self._update(change)
+
+    def _open(self, state, attempt):
+        delay = self.backoff[min(attempt, len(self.backoff) - 1)]
+        state.update({
+            "state": OPEN,
+            "attempt": attempt,
+            "opened_at": state.get("opened_at") or time.time(),
+            "next_probe": time.time() + delay * random.uniform(0.8, 1.2),
+        })
+        state.pop("probe_started", None)
+        return state
+
+    # --- Probe --------------------------------------------------------------
+
+    def probe(self, check):
+        """Führt `check()` aus, wenn eine Probe fällig ist und kein anderer Prozess prüft.
+
+        Gibt die Sekunden bis zur nächsten sinnvollen Prüfung zurück.
+        """
+        claimed = {}
+
+        def claim(state):
+            due = state["state"] == OPEN and time.time() >= state["next_probe"]
+            stale = state["state"] == HALF_OPEN and time.time() - state.get("probe_started", 0) > self.probe_timeout
+            if not (due or stale):
+                return None
+            claimed["attempt"] = state["attempt"]
+            return {**state, "state": HALF_OPEN, "probe_started": time.time()}
+
+        state = self._update(claim)
+        if not claimed:
+            if state["state"] == OPEN:
+                return max(1.0, state["next_probe"] - time.time())
+            return 5.0
+
+        try:
+            check()
+        except Exception as e:
+            if is_outage(e):
+                CIRCUIT_PROBES.inc(result="error")
+                logging.debug("Spotify-Probe fehlgeschlagen: %s", e)
+                state = self._update(lambda s: self._open(s, claimed["attempt"] + 1))
+                return max(1.0, state["next_probe"] - time.time())
+            # Eine Fehlerantwort (z. B. 401) heißt: Spotify ist erreichbar
+
+        CIRCUIT_PROBES.inc(result="ok")
+        self.record_success()
+        return 5.0
+
+    def start_prober(self, check):
+        """Hintergrund-Thread, der bei offenem Breaker nach Plan `check()` aufruft.
+
+        Jeder Dienst startet einen; über die Sperre prüft immer nur einer zur
+        Zeit, die übrigen übernehmen das Ergebnis aus der Zustandsdatei.
+        """
+        if self._prober is not None:
+            return self._prober
+
+        def loop():
+            while True:
+                try:
+                    if self.state == CLOSED:
+                        wait = 5.0
+                    else:
+                        wait = self.probe(check)
+                except Exception as e:
+                    logging.warning("⚠️ Fehler im Spotify-Probe-Thread: %s", e)
+                    wait = 10.0
+                time.sleep(wait)
+
+        self._prober = threading.Thread(target=loop, daemon=True)
+        self._prober.start()
+        return self._prober
+
+
+_breaker = None
+
+
+def shared_breaker():
+    """Der prozessweite Breaker für Spotify (alle Clients eines Prozesses teilen ihn)."""
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker()
+    return _breaker
+
+
+def guard_spotify(sp, breaker=None, probe=True):
+    """Schaltet den Breaker vor jeden API-Aufruf eines spotipy-Clients.
+
+    Als Probe dient GET /me – klein und ohne Seiteneffekte. Ein Token-Refresh
+    läuft innerhalb des Aufrufs; scheitert er offline, zählt das ebenfalls als Ausfall.
+    """
+    breaker = breaker or shared_breaker()
+    internal_call = sp._internal_call
+
+    def guarded_call(method, url, payload, params):
+        if not breaker.allow_request():
+            CIRCUIT_REJECTED.inc()
+            raise CircuitOpenError(f"Spotify offline, {method} {url} abgewiesen")
+        try:
+            result = internal_call(method, url, payload, params)
+        except Exception as e:
+            if is_outage(e):
+                breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+
+    sp._internal_call = guarded_call
+    if probe:
+        breaker.start_prober(lambda: internal_call("GET", "me", None, {}))
+    return breaker
@@ -0,0 +1,134 @@
+# device_images.py
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from libs import rgb565
+from libs.image_decode import decode_for_display
+
+DEFAULT_IMAGE = "default_device"
+
+
+def normalize_name(name):
+    return (name or "unknown").lower().replace(" ", "_")
+
+
+class DeviceImageIndex:
+    """Index über static/images (inkl. frames/ und thumbs/), einmal gescannt und im Speicher gehalten.
+
+    Änderungen (z. B. durch Uploads im Web-Service) werden über die mtime der
+    drei Verzeichnisse erkannt – höchstens ein stat() je Verzeichnis alle
+    `check_interval` Sekunden statt mehrerer exists() pro Render.
+    """
+
+    def __init__(self, images_dir, width=240, height=240, check_interval=2.0, max_frames=32):
+        self.images_dir = Path(images_dir)
+        self.frame_dir = self.images_dir / "frames"
+        self.thumb_dir = self.images_dir / "thumbs"
+        self.width = width
+        self.height = height
+        self.check_interval = check_interval
+        self.max_frames = max_frames
+
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()  # stem → bytes (LRU)
+        self._warned = set()
+        self._last_check = 0.0
+        self.scan()
+
+    def _dir_mtimes(self):
+        mtimes = []
+        for d in (self.images_dir, self.frame_dir, self.thumb_dir):
+            try:
+                mtimes.append(d.stat().st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return mtimes
+
+    def scan(self):
+        """Liest die Verzeichnisse komplett neu ein und verwirft gecachte Frames."""
+        with self._lock:
+            self._mtimes = self._dir_mtimes()
+            self._images = {p.stem: p for p in self.images_dir.glob("*.jpg")}
+            self._frame_files = {p.stem: p for p in self.frame_dir.glob("*.rgb565")}
+            self._thumbs = {p.stem for p in self.thumb_dir.glob("*.jpg")}
+            self._frames.clear()
+            self._warned.clear()
+            self._last_check = time.monotonic()
+        logging.debug("🗂 Geräte-Bildindex: %s Bilder, %s Frames", len(self._images), len(self._frame_files))
+
+    def invalidate(self):
+        """Erzwingt beim nächsten Zugriff einen neuen Scan (z. B. nach einem Upload)."""
+        self._last_check = 0.0
+        self._mtimes = None
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if self._dir_mtimes() != self._mtimes:
+            self.scan()
+
+    def resolve(self, device):
+        """Ordnet ein Spotify-Device-Dict einem Bildnamen zu: ID → normalisierter Name → Default."""
+        self._maybe_refresh()
+        device_id = device.get("id")
+        name = normalize_name(device.get("name"))
+        for stem in (device_id, name):
+            if stem and (stem in self._images or stem in self._frame_files):
+                return stem
+        if device_id not in self._warned:
+            self._warned.add(device_id)
+            logging.warning("🖼 Kein Bild für Gerät '%s' (%s), nutze Default.", device.get('name'), device_id)
+        return DEFAULT_IMAGE
+
+    def path(self, stem):
+        self._maybe_refresh()
+        return self._images.get(stem)
+
+    def frame(self, stem):
+        """Liefert den display-fertigen RGB565-Frame für `stem` (aus dem Speicher, sonst Datei bzw. einmal dekodiert).
+
+        Frames sind unrotiert – die Rotation übernimmt der Display-Controller (MADCTL).
+        """
+        self._maybe_refresh()
+        key = stem
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                return frame
+
+        frame_file = self._frame_files.get(key)
+        if frame_file is not None:
+            try:
+                frame = frame_file.read_bytes()
+            except OSError:
+                frame = None
+        if frame is None:
+            path = self._images.get(stem)
+            if path is None:
+                return None
+            frame = rgb565.to_rgb565(decode_for_display(path, self.width, self.height))
+
+        with self._lock:
+            self._frames[key] = frame
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        return frame
+
+    def frame_for_device(self, device):
+        return self.frame(self.resolve(device))
+
+    def web_image(self, device_id):
+        """Bild für die Weboberfläche relativ zu static/images: Thumbnail → JPEG → Default."""
+        self._maybe_refresh()
+        if device_id in self._thumbs:
+            return f"thumbs/{device_id}.jpg"
+        if device_id in self._images:
+            return f"{device_id}.jpg"
+        return f"{DEFAULT_IMAGE}.jpg"
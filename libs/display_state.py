@@ -0,0 +1,78 @@
+# display_state.py
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+# Felder des Snapshots, deren Änderung ein Schreiben auslöst (Fortschritt läuft ohnehin weiter)
+SNAPSHOT_KEYS = ("text", "duration_ms", "volume", "is_playing")
+
+
+class DisplayState:
+    """Letzter Frame je Panel und Wiedergabe-Snapshot auf der SD-Karte.
+
+    Geschrieben wird nur bei Änderung und atomar (temporäre Datei +
+    os.replace), sodass ein Stromausfall nie einen halben Frame hinterlässt.
+    Beim Start zeigt der Display-Service damit sofort das letzte Cover samt
+    Overlay an – noch vor Spotify-Auth und erster Abfrage.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._frames = {}  # Panel → zuletzt geschriebener bzw. gelesener Frame
+        self._snapshot = None
+
+    def _write(self, path, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _frame_path(self, name):
+        return self.directory / f"{name}.rgb565"
+
+    def save_frame(self, name, frame):
+        with self._lock:
+            if self._frames.get(name) == frame:
+                return
+            self._frames[name] = frame
+        try:
+            self._write(self._frame_path(name), frame)
+        except OSError as e:
+            logging.warning("⚠️ Frame für Panel %s konnte nicht gespeichert werden: %s", name, e)
+
+    def load_frame(self, name, size):
+        """Gespeicherter Frame oder None, falls keiner existiert oder die Größe nicht passt."""
+        try:
+            frame = self._frame_path(name).read_bytes()
+        except OSError:
+            return None
+        if len(frame) != size:
+            return None
+        with self._lock:
+            self._frames[name] = frame
+        return frame
+
+    def save_snapshot(self, snapshot):
+        relevant = {key: snapshot.get(key) for key in SNAPSHOT_KEYS}
+        with self._lock:
+            if self._snapshot == relevant:
+                return
+            self._snapshot = relevant
+        try:
+            self._write(self.directory / "playback.json", json.dumps(snapshot).encode())
+        except OSError as e:
+            logging.warning("⚠️ Wiedergabe-Snapshot konnte nicht gespeichert werden: %s", e)
+
+    def load_snapshot(self):
+        """Letzter Snapshot als eingefrorene Wiedergabe (der Fortschritt läuft erst mit Live-Daten weiter)."""
+        try:
+            snapshot = json.loads((self.directory / "playback.json").read_text())
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._snapshot = {key: snapshot.get(key) for key in SNAPSHOT_KEYS}
+        return {**snapshot, "is_playing": False}
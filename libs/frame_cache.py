@@ -0,0 +1,45 @@
+# frame_cache.py
+
+import threading
+from collections import OrderedDict
+
+from libs import metrics
+from libs import rgb565
+from libs.image_decode import decode_for_display
+
+FRAME_CACHE_LOOKUPS = metrics.counter("display_frame_cache_lookups_total", "Zugriffe auf den Frame-Cache", ("result",))
+
+
+class FrameCache:
+    """Display-fertige RGB565-Frames je (Bildschlüssel, Größe, Umrechnungsmodus), LRU im Speicher.
+
+    Gemeinsam für alle Panels: Zeigen zwei Panels dasselbe Cover, wird es nur
+    einmal dekodiert – und bei unveränderter Wiedergabe gar nicht erneut.
+    """
+
+    def __init__(self, max_frames=16):
+        self.max_frames = max_frames
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+
+    def get(self, key, width, height, mode, source):
+        """Frame für `key`; bei Fehlschlag wird `source()` (Pfad oder Datei-Objekt) dekodiert und umgerechnet."""
+        cache_key = (key, width, height, mode)
+        with self._lock:
+            frame = self._frames.get(cache_key)
+            if frame is not None:
+                self._frames.move_to_end(cache_key)
+                FRAME_CACHE_LOOKUPS.inc(result="hit")
+                return frame
+        FRAME_CACHE_LOOKUPS.inc(result="miss")
+
+        frame = rgb565.to_rgb565(decode_for_display(source(), width, height), mode)
+        self.put(cache_key, frame)
+        return frame
+
+    def put(self, cache_key, frame):
+        with self._lock:
+            self._frames[cache_key] = frame
+            self._frames.move_to_end(cache_key)
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
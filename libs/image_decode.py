@@ -0,0 +1,54 @@
+# image_decode.py
+
+from PIL import Image
+
+# Drehung gegen den Uhrzeigersinn wie bei Image.rotate()
+_TRANSPOSE = {
+    90: Image.ROTATE_90,
+    180: Image.ROTATE_180,
+    270: Image.ROTATE_270,
+}
+
+
+def rotate(image, rotation):
+    """Dreht um Vielfache von 90° per Transposition (wie image.rotate(rotation, expand=True))."""
+    rotation = int(rotation) % 360
+    if rotation == 0:
+        return image
+    if rotation in _TRANSPOSE:
+        return image.transpose(_TRANSPOSE[rotation])
+    return image.rotate(rotation, expand=True)
+
+
+def decode_for_display(source, width, height, rotation=0, crop_square=False):
+    """Dekodiert ein Bild direkt in Display-Größe.
+
+    JPEGs werden per Draft-Modus bereits beim Dekodieren um eine Zweierpotenz
+    verkleinert (libjpeg-Skalierung), danach folgt genau ein Resize und – bei
+    Vielfachen von 90° – eine verlustfreie Transposition statt Image.rotate().
+    """
+    rotation = int(rotation) % 360
+    image = Image.open(source)
+
+    # Zielgröße vor der Drehung
+    target = (height, width) if rotation in (90, 270) else (width, height)
+    if image.format == "JPEG":
+        image.draft("RGB", target)
+    image = image.convert("RGB")
+
+    box = None
+    if crop_square:
+        w, h = image.size
+        edge = min(w, h)
+        left, top = (w - edge) // 2, (h - edge) // 2
+        box = (left, top, left + edge, top + edge)
+
+    if rotation in _TRANSPOSE or rotation == 0:
+        if image.size != target or box:
+            image = image.resize(target, box=box)
+        return rotate(image, rotation)
+
+    # Beliebige Winkel: altes Verhalten
+    if box:
+        image = image.crop(box)
+    return image.rotate(rotation, expand=True).resize((width, height))
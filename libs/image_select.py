@@ -0,0 +1,62 @@
+# image_select.py
+
+import logging
+import threading
+
+from libs import metrics
+
+BYTES_DOWNLOADED = metrics.counter("image_download_bytes_total", "Heruntergeladene Bild-Bytes")
+BYTES_SAVED = metrics.counter("image_download_saved_bytes_total", "Geschätzt gesparte Bytes durch kleinere Bildvarianten")
+
+# Gesamtstatistik über alle Downloads dieses Prozesses
+stats = {"downloads": 0, "bytes_downloaded": 0, "bytes_saved": 0}
+_lock = threading.Lock()
+
+
+def _area(image):
+    return (image.get("width") or 0) * (image.get("height") or 0)
+
+
+def select_image(images, width, height, rotation=0):
+    """Wählt aus einer Spotify-Bildliste die kleinste Variante, die das Display noch füllt.
+
+    Fehlen Größenangaben, wird wie bisher das erste (größte) Bild genommen.
+    """
+    if not images:
+        return None
+    if int(rotation) % 180 == 90:
+        width, height = height, width
+
+    sized = [img for img in images if img.get("width") and img.get("height")]
+    if not sized:
+        return images[0]
+
+    sufficient = [img for img in sized if img["width"] >= width and img["height"] >= height]
+    if sufficient:
+        return min(sufficient, key=_area)
+    # Keine Variante groß genug → die größte verfügbare
+    return max(sized, key=_area)
+
+
+def record_download(url, images, size):
+    """Verbucht einen Download und schätzt die gegenüber der größten Variante gesparten Bytes."""
+    chosen = next((img for img in images if img.get("url") == url), None)
+    largest = max(images, key=_area) if images else None
+    saved = 0
+    if chosen and largest and _area(chosen) and _area(largest) > _area(chosen):
+        saved = int(size * _area(largest) / _area(chosen)) - size
+
+    with _lock:
+        stats["downloads"] += 1
+        stats["bytes_downloaded"] += size
+        stats["bytes_saved"] += saved
+    BYTES_DOWNLOADED.inc(size)
+    BYTES_SAVED.inc(saved)
+
+    if saved and chosen:
+        logging.debug(
+            "📉 Bildvariante %sx%s statt %sx%s: ~%s KB gespart (gesamt ~%s KB)",
+            chosen["width"], chosen["height"], largest["width"], largest["height"],
+            saved // 1024, stats["bytes_saved"] // 1024
+        )
+    return saved
@@ -0,0 +1,170 @@
+# image_store.py
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from libs import metrics
+
+CACHE_LOOKUPS = metrics.counter("image_cache_lookups_total", "Lookups im Bild-Store", ("result",))
+CACHE_BYTES = metrics.gauge("image_cache_bytes", "Belegter Speicher des Bild-Stores")
+
+
+class ImageStore:
+    """Indexierter Bild-Cache: Schlüssel (URL, Spotify-ID) → Blob mit Content-Hash.
+
+    Gleiche Bilddaten werden nur einmal gespeichert, egal über wie viele
+    Schlüssel sie erreichbar sind. Der Index liegt in SQLite und wird beim
+    Start komplett in den Speicher geladen, damit Lookups ohne Dateisystem-
+    Zugriff auskommen.
+    """
+
+    def __init__(self, cache_dir, max_bytes=50 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.blob_dir = self.cache_dir / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.cache_dir / "index.sqlite"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS keys (
+                key TEXT PRIMARY KEY,
+                hash TEXT NOT NULL REFERENCES blobs(hash)
+            );
+        """)
+
+        # In-Memory-Spiegel des Index: key → hash, hash → [size, refcount, last_used]
+        self._keys = dict(self._db.execute("SELECT key, hash FROM keys"))
+        self._blobs = {h: [size, 0, last_used] for h, size, last_used in self._db.execute("SELECT hash, size, last_used FROM blobs")}
+        for h in self._keys.values():
+            if h in self._blobs:
+                self._blobs[h][1] += 1
+        self._dirty = set()
+        self.total_bytes = sum(b[0] for b in self._blobs.values())
+        CACHE_BYTES.set(self.total_bytes)
+
+        self._migrate_legacy_files()
+
+    def _blob_path(self, h):
+        return self.blob_dir / f"{h}.jpg"
+
+    def lookup(self, key):
+        """Liefert den Pfad zum Blob für `key` oder None (ohne Dateisystem-Zugriff)."""
+        with self._lock:
+            h = self._keys.get(key)
+            if h is None or h not in self._blobs:
+                CACHE_LOOKUPS.inc(result="miss")
+                return None
+            CACHE_LOOKUPS.inc(result="hit")
+            self._blobs[h][2] = time.time()
+            self._dirty.add(h)
+            return self._blob_path(h)
+
+    def link(self, key, path):
+        """Verknüpft einen weiteren Schlüssel mit einem vorhandenen Blob."""
+        with self._lock:
+            self._link(key, Path(path).stem)
+            self._db.commit()
+
+    def put(self, data, keys):
+        """Speichert Bilddaten (dedupliziert) und verknüpft alle `keys` damit."""
+        h = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(h)
+        with self._lock:
+            now = time.time()
+            if h not in self._blobs:
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+                self._blobs[h] = [len(data), 0, now]
+                self.total_bytes += len(data)
+                CACHE_BYTES.set(self.total_bytes)
+                self._db.execute("INSERT OR REPLACE INTO blobs (hash, size, last_used) VALUES (?, ?, ?)", (h, len(data), now))
+                logging.debug("💾 Neues Bild im Store: %s (%s Bytes)", h[:12], len(data))
+            else:
+                self._blobs[h][2] = now
+                self._dirty.add(h)
+            for key in keys:
+                self._link(key, h)
+            self._db.commit()
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    def _link(self, key, h):
+        old = self._keys.get(key)
+        if old == h:
+            return
+        if old is not None and old in self._blobs:
+            self._blobs[old][1] -= 1
+        self._keys[key] = h
+        self._blobs[h][1] += 1
+        self._db.execute("INSERT OR REPLACE INTO keys (key, hash) VALUES (?, ?)", (key, h))
+
+    def _flush_last_used(self):
+        if self._dirty:
+            self._db.executemany(
+                "UPDATE blobs SET last_used = ? WHERE hash = ?",
+                [(self._blobs[h][2], h) for h in self._dirty if h in self._blobs],
+            )
+            self._dirty.clear()
+
+    def _remove_blob(self, h):
+        size = self._blobs.pop(h)[0]
+        self.total_bytes -= size
+        for key in [k for k, v in self._keys.items() if v == h]:
+            del self._keys[key]
+        self._db.execute("DELETE FROM keys WHERE hash = ?", (h,))
+        self._db.execute("DELETE FROM blobs WHERE hash = ?", (h,))
+        try:
+            self._blob_path(h).unlink()
+        except FileNotFoundError:
+            pass
+
+    def evict(self, max_age_days=None):
+        """Entfernt unreferenzierte, veraltete und (LRU) überzählige Blobs. Rückgabe: Anzahl."""
+        removed = 0
+        with self._lock:
+            self._flush_last_used()
+            cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+
+            for h, (size, refcount, last_used) in list(self._blobs.items()):
+                if refcount <= 0 or (cutoff is not None and last_used < cutoff):
+                    self._remove_blob(h)
+                    removed += 1
+
+            if self.total_bytes > self.max_bytes:
+                for h in sorted(self._blobs, key=lambda h: self._blobs[h][2]):
+                    if self.total_bytes <= self.max_bytes:
+                        break
+                    self._remove_blob(h)
+                    removed += 1
+
+            self._db.commit()
+            CACHE_BYTES.set(self.total_bytes)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {"keys": len(self._keys), "blobs": len(self._blobs), "bytes": self.total_bytes}
+
+    def _migrate_legacy_files(self):
+        """Übernimmt Artist-Bilder aus dem alten flachen Cache (a_<id>.jpg), löscht den Rest."""
+        for file in self.cache_dir.glob("*.jpg"):
+            try:
+                if file.stem.startswith("a_"):
+                    self.put(file.read_bytes(), [file.stem])
+                file.unlink()
+            except Exception as e:
+                logging.warning("⚠️  Fehler beim Migrieren von %s: %s", file.name, e)
@@ -69,6 +69,16 @@ class RaspberryPi:
     def spi_writebyte(self, data):
         if self.SPI!=None :
             self.SPI.writebytes(data)
+
+    def spi_writebuffer(self, data):
+        """Write a bytes-like buffer; uses writebytes2 (no list conversion, no 4096 limit) if available"""
+        if self.SPI==None :
+            return
+        if hasattr(self.SPI, "writebytes2"):
+            self.SPI.writebytes2(data)
+        else:
+            for i in range(0, len(data), 4096):
+                self.SPI.writebytes(list(data[i:i+4096]))
     def bl_DutyCycle(self, duty):
         self._pwm.ChangeDutyCycle(duty)
         
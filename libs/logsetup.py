@@ -0,0 +1,201 @@
+# logsetup.py
+
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+from libs import metrics
+
+LEVEL_PATH = Path(__file__).resolve().parent.parent / "run" / "loglevel.json"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+# Bibliotheken, die auf INFO/DEBUG jede HTTP-Anfrage loggen
+QUIET_LOGGERS = ("requests", "urllib3", "werkzeug")
+
+LOG_DROPPED = metrics.counter("log_records_dropped_total", "Verworfene Log-Einträge (Warteschlange voll)")
+LOG_SUPPRESSED = metrics.counter("log_records_suppressed_total", "Unterdrückte Wiederholungen von Warnungen")
+
+
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+class RateLimitFilter(logging.Filter):
+    """Lässt dieselbe Meldung ab `min_level` höchstens einmal je `interval` Sekunden durch.
+
+    Gleich heißt: gleicher Logger, Level und Meldungstext (ohne Objektadressen). Die
+    Zahl der unterdrückten Wiederholungen wird an die nächste durchgelassene
+    Meldung angehängt, es geht also nichts stillschweigend verloren.
+    """
+
+    def __init__(self, interval=60.0, min_level=logging.WARNING, max_keys=256):
+        super().__init__()
+        self.interval = interval
+        self.min_level = min_level
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()  # key → [Zeitpunkt, unterdrückt]
+
+    @staticmethod
+    def _key(record):
+        # Fertige Meldung statt roher Argumente: Exceptions hashen nach Identität, und
+        # Objektadressen („object at 0x7f…“) ändern sich bei jedem neuen Verbindungsfehler
+        try:
+            message = record.getMessage()
+        except Exception:
+            message = f"{record.msg} {record.args!r}"
+        return record.name, record.levelno, _ADDRESS.sub("", message)
+
+    def filter(self, record):
+        if record.levelno < self.min_level:
+            return True
+        key = self._key(record)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] < self.interval:
+                entry[1] += 1
+                LOG_SUPPRESSED.inc()
+                return False
+            suppressed = entry[1] if entry is not None else 0
+            self._seen[key] = [now, 0]
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed}× unterdrückt)"
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Reicht Records unformatiert an den Writer-Thread weiter und blockiert nie.
+
+    Die Standard-Implementierung formatiert in prepare() bereits im
+    aufrufenden Thread; hier passiert das erst im QueueListener. Ist die
+    Warteschlange voll (z. B. hängendes journald), wird verworfen statt gewartet.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+_listener = None
+_service = None
+_members = ()
+
+
+def setup(service, level=None, capacity=10000, members=()):
+    """Richtet das Logging eines Dienstes ein (mehrfacher Aufruf im selben Prozess ist harmlos).
+
+    Alle Records laufen über eine Warteschlange in einen Writer-Thread, der
+    nach stdout (→ journald) schreibt. Das Level kommt aus `level`, sonst
+    aus run/loglevel.json und folgt dort späteren Änderungen (Web-UI).
+    `members` sind die Dienste eines All-in-one-Prozesses, deren Einträge
+    dort ebenfalls gelten.
+    """
+    global _listener, _service, _members
+    if _listener is not None:
+        return
+    _service = service
+    _members = tuple(members)
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(FORMAT))
+    log_queue = queue.Queue(maxsize=capacity)
+    handler = _NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = QueueListener(log_queue, stream)
+    _listener.start()
+    atexit.register(_listener.stop)  # restliche Einträge beim Beenden noch schreiben
+
+    if level:
+        root.setLevel(level)
+    else:
+        apply_level()
+        start_level_watcher()
+
+
+def read_levels():
+    """{"default": "INFO", "<dienst>": "DEBUG", ...} aus run/loglevel.json."""
+    try:
+        return json.loads(LEVEL_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_level(level, service=None):
+    """Setzt das Level für `service` bzw. ohne Angabe für alle Dienste (ersetzt dann Einzelwerte)."""
+    level = level.upper()
+    if level not in LEVELS:
+        raise ValueError(f"Unknown log level {level!r}, expected one of {LEVELS}.")
+    levels = read_levels() if service else {}
+    levels[service or "default"] = level
+    LEVEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = LEVEL_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(levels))
+    os.replace(tmp, LEVEL_PATH)
+    return levels
+
+
+def effective_level(levels):
+    """Level für diesen Prozess: eigener Eintrag, sonst der gesprächigste der Mitglieder bzw. default.
+
+    Die Dienste im All-in-one-Prozess loggen über denselben Root-Logger;
+    DEBUG für display schaltet dort also alle auf DEBUG.
+    """
+    default = levels.get("default") or "INFO"
+    if levels.get(_service):
+        return levels[_service]
+    if not _members:
+        return default
+    return min((levels.get(member) or default for member in _members), key=logging.getLevelName)
+
+
+def apply_level():
+    level = effective_level(read_levels())
+    root = logging.getLogger()
+    if logging.getLevelName(root.level) != level:
+        root.setLevel(level)
+        logging.info("📝 Log-Level: %s", level)
+
+
+def start_level_watcher(interval=2.0):
+    """Übernimmt Änderungen an run/loglevel.json (ein stat() je `interval` Sekunden)."""
+    def run():
+        last = None
+        while True:
+            time.sleep(interval)
+            try:
+                mtime = LEVEL_PATH.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != last:
+                last = mtime
+                apply_level()
+
+    thread = threading.Thread(target=run, name="loglevel", daemon=True)
+    thread.start()
+    return thread
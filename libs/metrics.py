@@ -0,0 +1,236 @@
+# metrics.py
+
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from libs import tracing
+
+# Latenz-Buckets in Sekunden (1 ms ... 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        # Immer Strings: gemischte Typen (HTTP-Status 429 neben "error") ließen sorted() scheitern
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [Zähler je Bucket..., +Inf, Summe]
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key, entry):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), entry[:-1]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {entry[-1]:.6f}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name, help, labelnames=()):
+    return REGISTRY._get_or_create(Counter, name, help, labelnames)
+
+
+def gauge(name, help, labelnames=()):
+    return REGISTRY._get_or_create(Gauge, name, help, labelnames)
+
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+
+def render():
+    return REGISTRY.render()
+
+
+# --- Spotify ---------------------------------------------------------------
+
+SPOTIFY_LATENCY = histogram("spotify_request_seconds", "Dauer der Spotify-API-Aufrufe", ("endpoint",))
+SPOTIFY_ERRORS = counter("spotify_errors_total", "Fehlgeschlagene Spotify-API-Aufrufe", ("endpoint", "status"))
+
+_ID_SEGMENT = re.compile(r"^[0-9A-Za-z]{16,}$|^\d+$")
+
+
+def spotify_endpoint(method, url):
+    """Normalisiert eine Spotify-URL zu einem Label ohne IDs, z. B. 'GET artists/{id}/top-tracks'."""
+    path = url.split("://", 1)[-1].split("?", 1)[0]
+    if path.startswith("api.spotify.com/v1/"):
+        path = path[len("api.spotify.com/v1/"):]
+    segments = ["{id}" if _ID_SEGMENT.match(s) else s for s in path.strip("/").split("/")]
+    return f"{method} {'/'.join(segments)}"
+
+
+def instrument_spotify(sp):
+    """Misst jeden API-Aufruf eines spotipy-Clients (Latenz je Endpoint, Fehler inkl. 429).
+
+    Läuft gerade ein Trace, wird der Aufruf zusätzlich als Span erfasst.
+    """
+    internal_call = sp._internal_call
+
+    def timed_call(method, url, payload, params):
+        endpoint = spotify_endpoint(method, url)
+        wall = time.time()
+        start = time.perf_counter()
+        try:
+            return internal_call(method, url, payload, params)
+        except Exception as e:
+            SPOTIFY_ERRORS.inc(endpoint=endpoint, status=getattr(e, "http_status", None) or "error")
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            SPOTIFY_LATENCY.observe(elapsed, endpoint=endpoint)
+            tracing.record(f"spotify {endpoint}", wall, elapsed)
+
+    sp._internal_call = timed_call
+    return sp
+
+
+# --- Export ----------------------------------------------------------------
+
+def start_socket_exporter(path):
+    """Stellt die Metriken für Dienste ohne HTTP-Server über einen Unix-Socket bereit.
+
+    Jede Verbindung erhält den aktuellen Prometheus-Text und wird geschlossen
+    (z. B. `socat - UNIX-CONNECT:run/display.sock`).
+    """
+    path = str(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(4)
+
+    def run():
+        while True:
+            try:
+                conn, _ = server.accept()
+                with conn:
+                    conn.sendall(render().encode("utf-8"))
+            except Exception as e:
+                logging.debug("Metrik-Socket-Fehler: %s", e)
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return server
+
+
+def read_socket(path, timeout=1.0):
+    """Liest die Metriken eines anderen Dienstes von dessen Unix-Socket."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(str(path))
+        chunks = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks).decode("utf-8")
@@ -0,0 +1,207 @@
+# overlay.py
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATHS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+CHARSET = "".join(chr(c) for c in range(32, 127)) + "ÄÖÜäöüßéèáàêçñ–…·"
+
+BAR_BG = 0x4208   # dunkelgrau
+BAR_FG = 0x1DCA   # Spotify-Grün (#1DB954 in RGB565)
+BADGE_BG = 0xA800  # dunkelrot
+
+
+def load_font(size):
+    for path in FONT_PATHS:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    logging.warning("⚠️ Keine TrueType-Schrift gefunden, nutze PIL-Standardschrift.")
+    return ImageFont.load_default()
+
+
+class GlyphAtlas:
+    """Einmal gerasterte Glyphen als Alpha-Masken; Text wird daraus nur noch zusammenkopiert."""
+
+    def __init__(self, size=16, charset=CHARSET):
+        font = load_font(size)
+        ascent, descent = font.getmetrics()
+        self.height = ascent + descent
+        self.glyphs = {}
+        for char in charset:
+            advance = max(1, int(round(font.getlength(char))))
+            canvas = Image.new("L", (advance, self.height), 0)
+            ImageDraw.Draw(canvas).text((0, 0), char, font=font, fill=255)
+            self.glyphs[char] = np.asarray(canvas, dtype=np.uint8)
+        self._lines = OrderedDict()
+
+    def render(self, text, max_width):
+        """Alpha-Maske (height × Breite) für eine Zeile; zu lange Texte enden mit '…'."""
+        key = (text, max_width)
+        mask = self._lines.get(key)
+        if mask is not None:
+            self._lines.move_to_end(key)
+            return mask
+
+        glyphs = [self.glyphs.get(c, self.glyphs["?"]) for c in text]
+        widths = [g.shape[1] for g in glyphs]
+        if sum(widths) > max_width:
+            ellipsis = self.glyphs["…"]
+            budget = max_width - ellipsis.shape[1]
+            while glyphs and sum(widths) > budget:
+                glyphs.pop()
+                widths.pop()
+            glyphs.append(ellipsis)
+            widths.append(ellipsis.shape[1])
+
+        mask = np.zeros((self.height, sum(widths)), dtype=np.uint8)
+        x = 0
+        for glyph, width in zip(glyphs, widths):
+            mask[:, x:x + width] = glyph
+            x += width
+
+        self._lines[key] = mask
+        if len(self._lines) > 32:
+            self._lines.popitem(last=False)
+        return mask
+
+
+def _blend_white(pixels, alpha):
+    """Mischt Weiß mit `alpha` (0..255) über RGB565-Pixel (native uint16)."""
+    a = alpha.astype(np.uint32)
+    p = pixels.astype(np.uint32)
+    r = ((p >> 11) * (255 - a) + 31 * a) // 255
+    g = (((p >> 5) & 0x3F) * (255 - a) + 63 * a) // 255
+    b = ((p & 0x1F) * (255 - a) + 31 * a) // 255
+    return ((r << 11) | (g << 5) | b).astype(np.uint16)
+
+
+class NowPlayingOverlay:
+    """Blendet Titel/Interpret, Lautstärke und Fortschrittsbalken über das Cover.
+
+    Jede Ebene wird gecacht: Das abgedunkelte Textband nur bei neuem Cover
+    oder Titel, der Balken nur, wenn sich seine Breite um ein Pixel ändert.
+    `changed_rows()` liefert die Zeilenbereiche, die sich gegenüber dem
+    Panel-Inhalt geändert haben – zwischen zwei Titelwechseln sind das nur
+    die drei Zeilen des Balkens.
+    """
+
+    def __init__(self, width=240, height=240, font_size=16, bar_height=3):
+        self.width = width
+        self.height = height
+        self.atlas = GlyphAtlas(font_size)
+        self.bar_height = bar_height
+        self.band_height = self.atlas.height + 6
+        self.band_top = height - bar_height - self.band_height
+        self.bar_top = height - bar_height
+
+        self._base = None
+        self._band = (None, None)  # (key, Zeilen)
+        self._bar = (None, None)
+        self._badge = None
+        self.screen = None  # was gerade auf dem Panel steht (native uint16)
+        self.screen_key = None  # state_key() zu `screen`
+
+    def set_base(self, frame):
+        self._base = np.frombuffer(frame, dtype=">u2").reshape(self.height, self.width).astype(np.uint16)
+        self._band = self._bar = (None, None)
+        self.screen_key = None
+
+    def clear(self):
+        self._base = None
+        self.screen = None
+        self.screen_key = None
+
+    def _fill(self, progress_ms, duration_ms):
+        return min(self.width, int(self.width * (progress_ms or 0) / duration_ms))
+
+    def state_key(self, text, progress_ms=None, duration_ms=None, volume=None, offline=False):
+        """Alles, was compose() sichtbar macht; gleicher Schlüssel heißt: gleicher Frame."""
+        fill = self._fill(progress_ms, duration_ms) if text is not None and duration_ms else None
+        return text, volume, fill, offline
+
+    @property
+    def active(self):
+        return self._base is not None
+
+    def _band_rows(self, text, volume):
+        key = (text, volume)
+        if self._band[0] == key:
+            return self._band[1]
+        rows = self._base[self.band_top:self.bar_top].copy()
+        rows >>= 1
+        rows &= 0x7BEF  # halbe Helligkeit je Kanal
+
+        x, y = 4, 3
+        right = self.width - 4
+        if volume is not None:
+            label = self.atlas.render(f"{volume}%", self.width)
+            right -= label.shape[1]
+            area = rows[y:y + label.shape[0], right:right + label.shape[1]]
+            area[:] = _blend_white(area, label)
+            right -= 6
+        line = self.atlas.render(text, right - x)
+        area = rows[y:y + line.shape[0], x:x + line.shape[1]]
+        area[:] = _blend_white(area, line)
+
+        self._band = (key, rows)
+        return rows
+
+    def _bar_rows(self, fill):
+        if self._bar[0] == fill:
+            return self._bar[1]
+        rows = np.empty((self.bar_height, self.width), dtype=np.uint16)
+        rows[:, :fill] = BAR_FG
+        rows[:, fill:] = BAR_BG
+        self._bar = (fill, rows)
+        return rows
+
+    def _badge_pixels(self):
+        """„offline“-Plakette (einmal gerendert, unabhängig vom Cover)."""
+        if self._badge is None:
+            label = self.atlas.render("offline", self.width)
+            badge = np.full((label.shape[0] + 4, label.shape[1] + 8), BADGE_BG, dtype=np.uint16)
+            area = badge[2:2 + label.shape[0], 4:4 + label.shape[1]]
+            area[:] = _blend_white(area, label)
+            self._badge = badge
+        return self._badge
+
+    def compose(self, text, progress_ms=None, duration_ms=None, volume=None, offline=False):
+        """Vollständiger Frame (native uint16) aus Cover, Textband, Balken und ggf. Offline-Plakette.
+
+        Ohne `text` bleibt das Cover unverändert (nur die Plakette wird gezeichnet).
+        """
+        frame = self._base.copy()
+        if text is not None:
+            frame[self.band_top:self.bar_top] = self._band_rows(text, volume)
+            if duration_ms:
+                frame[self.bar_top:] = self._bar_rows(self._fill(progress_ms, duration_ms))
+        if offline:
+            badge = self._badge_pixels()
+            x = self.width - badge.shape[1] - 4
+            frame[4:4 + badge.shape[0], x:x + badge.shape[1]] = badge
+        return frame
+
+    def changed_rows(self, frame):
+        """Zusammenhängende Zeilenbereiche [y0, y1), in denen sich `frame` vom Panel-Inhalt unterscheidet."""
+        if self.screen is None:
+            return [(0, self.height)]
+        diff = np.flatnonzero(np.any(frame != self.screen, axis=1))
+        ranges = []
+        for y in diff.tolist():
+            if ranges and ranges[-1][1] == y:
+                ranges[-1][1] = y + 1
+            else:
+                ranges.append([y, y + 1])
+        return [tuple(r) for r in ranges]
+
+    @staticmethod
+    def to_bytes(frame):
+        return frame.astype(">u2").tobytes()
@@ -0,0 +1,248 @@
+# panel.py
+
+import logging
+import queue
+import threading
+import time
+
+from libs import LCD_1inch3
+from libs import metrics
+from libs import rgb565
+from libs import transitions
+from libs.overlay import NowPlayingOverlay
+
+PUSH_SECONDS = metrics.histogram("display_push_seconds", "Dauer der SPI-Übertragungen je Panel", ("panel", "kind"))
+
+# Bisherige feste Verdrahtung (ein Panel an SPI 0.0)
+DEFAULT_PANEL = {"name": "main", "bus": 0, "device": 0, "rst": 27, "dc": 25, "bl": 18}
+
+
+class BusWorker:
+    """Ein Thread je SPI-Bus: Übertragungen an Panels desselben Busses laufen nacheinander,
+    verschiedene Busse parallel – der Render-Thread wartet auf keine davon."""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name=f"spi-bus-{bus}", daemon=True).start()
+
+    def submit(self, fn, *args, **kwargs):
+        self._queue.put((fn, args, kwargs))
+
+    def join(self):
+        """Wartet, bis alle bisher eingereihten Übertragungen erledigt sind."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            fn, args, kwargs = self._queue.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logging.error("❌ Fehler auf SPI-Bus %s: %s", self.bus, e)
+            finally:
+                self._queue.task_done()
+
+
+class Panel:
+    """Ein LCD mit eigenem Modus, eigener Rotation und eigenem Overlay.
+
+    Zustand wie letzter Frame oder Sleep gehört dem Render-Thread; der
+    Treiber selbst wird ausschließlich im BusWorker angesprochen.
+    """
+
+    def __init__(self, name, disp, worker, mode=None, rotation=None, overlay=None, state=None):
+        self.name = name
+        self.disp = disp
+        self.worker = worker
+        self.state = state  # DisplayState: letzter Live-Frame übersteht Neustarts
+        # None → jeweils der globale Wert aus config.json (displayMode, rotation, overlay)
+        self.mode = mode
+        self.fixed_rotation = rotation
+        self.show_overlay = overlay
+        self.rotation = disp.rotation
+        self.overlay = NowPlayingOverlay(disp.width, disp.height)
+        self.last_frame = None  # was auf dem Panel steht (inkl. Overlay)
+        self.last_base = None   # zuletzt gezeigtes Bild ohne Overlay
+        self.idle_since = None
+        self.sleeping = False
+        self.offline = False    # Spotify nicht erreichbar → Plakette im Overlay
+        self.last_live = None   # letztes Live-Bild ohne Overlay (Anzeige im Offline-Fall)
+
+    @property
+    def width(self):
+        return self.disp.width
+
+    @property
+    def height(self):
+        return self.disp.height
+
+    def _timed(self, kind, fn, *args, **kwargs):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        PUSH_SECONDS.observe(time.perf_counter() - start, panel=self.name, kind=kind)
+
+    def display_mode(self, config):
+        return self.mode or config.get("displayMode", "device")
+
+    def wants_overlay(self, config):
+        return config.get("overlay", True) if self.show_overlay is None else self.show_overlay
+
+    def _overlay_args(self, now_playing):
+        """Argumente für overlay.compose() bzw. overlay.state_key() zum jetzigen Zeitpunkt."""
+        if not now_playing:
+            return None, None, None, None, self.offline
+        progress = now_playing["progress_ms"]
+        if now_playing["is_playing"] and not self.offline:
+            progress += (time.time() - now_playing["fetched"]) * 1000
+        return now_playing["text"], progress, now_playing["duration_ms"], now_playing["volume"], self.offline
+
+    def _compose(self, now_playing):
+        args = self._overlay_args(now_playing)
+        self.overlay.screen_key = self.overlay.state_key(*args)
+        return self.overlay.compose(*args)
+
+    def show(self, frame, live=True, now_playing=None, transition=None):
+        """Reiht einen Frame zur Übertragung ein.
+
+        `live`: Bild der aktuellen Wiedergabe → mit Overlay und Übergang
+        (`transition` = Argumente für transitions.play). Status- und Fallback-
+        Bilder werden ohne beides sofort gezeigt.
+        """
+        if frame == self.last_base and not self.sleeping:
+            return
+        self.last_base = frame
+        base = frame
+
+        composed = None
+        if live:
+            self.last_live = frame
+        if live and (now_playing or self.offline):
+            self.overlay.set_base(frame)
+            composed = self._compose(now_playing)
+            frame = self.overlay.to_bytes(composed)
+        else:
+            self.overlay.clear()
+
+        if live and transition and not self.sleeping:
+            self.worker.submit(self._timed, "transition", transitions.play, self.disp, self.last_frame, frame, **transition)
+        else:
+            self.worker.submit(self._timed, "frame", self.disp.ShowFrame, frame)
+        self.last_frame = frame
+        self.sleeping = False  # ShowFrame weckt das Panel
+        self.overlay.screen = composed
+        if live and self.state is not None:
+            # Nach der Übertragung im BusWorker – die Render-Schleife wartet nicht auf die SD-Karte
+            self.worker.submit(self.state.save_frame, self.name, base)
+
+    def restore(self, now_playing=None):
+        """Zeigt den zuletzt gespeicherten Live-Frame; False, wenn keiner vorliegt."""
+        if self.state is None:
+            return False
+        frame = self.state.load_frame(self.name, rgb565.frame_size(self.width, self.height))
+        if frame is None:
+            return False
+        self.show(frame, True, now_playing)
+        logging.info("♻️ Panel %s: letztes Bild wiederhergestellt", self.name)
+        return True
+
+    def tick(self, now_playing):
+        """Schreibt das Overlay lokal fort und überträgt nur geänderte Zeilen."""
+        if not self.overlay.active or self.sleeping:
+            return
+        args = self._overlay_args(now_playing)
+        key = self.overlay.state_key(*args)
+        if self.overlay.screen is not None and key == self.overlay.screen_key:
+            return  # Balken hat sich um kein Pixel bewegt, Text und Plakette unverändert
+        composed = self.overlay.compose(*args)
+        self.overlay.screen_key = key
+        ranges = self.overlay.changed_rows(composed)
+        if not ranges:
+            return
+        data = self.overlay.to_bytes(composed)
+        row_bytes = rgb565.frame_size(self.width, 1)
+        for y0, y1 in ranges:
+            self.worker.submit(self._timed, "rows", self.disp.ShowRows, data[y0 * row_bytes:y1 * row_bytes], y0, y1)
+        self.overlay.screen = composed
+        self.last_frame = data
+
+    def set_offline(self, offline, now_playing=None):
+        """Offline: letztes Live-Bild mit Plakette statt Fehlerbild; online: Plakette wieder entfernen."""
+        if offline == self.offline:
+            return
+        self.offline = offline
+        if self.sleeping:
+            return
+        if offline and self.last_live is not None:
+            self.last_base = None  # erzwingt die Übertragung, auch wenn das Cover schon angezeigt wird
+            self.show(self.last_live, True, now_playing)
+        else:
+            self.tick(now_playing)
+
+    def sleep(self):
+        if not self.sleeping:
+            self.worker.submit(self.disp.sleep)
+            self.sleeping = True
+
+    def apply_rotation(self, config):
+        """Übernimmt eine geänderte Rotation per MADCTL; der letzte Frame bleibt gültig und wird neu übertragen."""
+        rotation = int(config.get("rotation", 0) if self.fixed_rotation is None else self.fixed_rotation)
+        if rotation == self.rotation:
+            return
+        self.rotation = rotation
+        self.worker.submit(self.disp.set_rotation, rotation)
+        if self.last_frame is not None:
+            self.worker.submit(self.disp.ShowFrame, self.last_frame)
+        logging.info("🔄 Panel %s: Rotation %s°", self.name, rotation)
+
+
+def create_panels(config, state=None, now_playing=None):
+    """Erzeugt und initialisiert alle Panels aus config "panels" (ohne Eintrag: ein Panel wie bisher).
+
+    Ein Eintrag: {"name", "bus", "device", "rst", "dc", "bl", "mode",
+    "rotation", "overlay", "spiMHz"} – fehlende Pins wie DEFAULT_PANEL,
+    fehlende Einstellungen aus den globalen Werten. Panels mit gemeinsamer
+    RST-Leitung werden nur einmal zurückgesetzt, ein zweiter Reset würde das
+    bereits initialisierte Panel wieder löschen. Die Hintergrundbeleuchtung
+    läuft per PWM und braucht daher je Panel einen eigenen Pin.
+
+    Mit `state` zeigt jedes Panel direkt nach dem Init seinen letzten
+    gespeicherten Frame (mit Overlay aus `now_playing`) statt eines leeren Bildes.
+    """
+    import spidev as SPI
+
+    specs = [{**DEFAULT_PANEL, "name": f"panel{index}", **spec} for index, spec in enumerate(config.get("panels") or [DEFAULT_PANEL])]
+    bl_pins = [spec["bl"] for spec in specs]
+    if len(set(bl_pins)) != len(bl_pins):
+        raise ValueError(f"Panels need distinct BL pins, got {bl_pins}.")
+
+    workers = {}
+    panels = []
+    reset_pins = set()
+    for spec in specs:
+        disp = LCD_1inch3.LCD_1inch3(
+            spi=SPI.SpiDev(spec["bus"], spec["device"]),
+            spi_freq=int(spec.get("spiMHz", config.get("spiMHz", 40))) * 1000000,
+            rst=spec["rst"],
+            dc=spec["dc"],
+            bl=spec["bl"]
+        )
+        disp.rotation = int(spec.get("rotation", config.get("rotation", 0)))
+        disp.Init(reset=spec["rst"] not in reset_pins)
+        reset_pins.add(spec["rst"])
+
+        worker = workers.get(spec["bus"])
+        if worker is None:
+            worker = workers[spec["bus"]] = BusWorker(spec["bus"])
+        panel = Panel(
+            spec["name"], disp, worker,
+            mode=spec.get("mode"),
+            rotation=spec.get("rotation"),
+            overlay=spec.get("overlay"),
+            state=state
+        )
+        if not panel.restore(now_playing if panel.wants_overlay(config) else None):
+            disp.clear()
+        panels.append(panel)
+        logging.info("🖥 Panel %s: SPI %s.%s, DC %s, Modus %s", spec['name'], spec['bus'], spec['device'], spec['dc'], spec.get('mode') or 'global')
+    return panels
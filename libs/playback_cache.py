@@ -0,0 +1,115 @@
+# playback_cache.py
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from libs import metrics
+
+CACHE_LOOKUPS = metrics.counter("playback_cache_lookups_total", "Lookups im Playback-Cache", ("result",))
+
+
+class ResolvedPlaybackCache:
+    """Cache für Tags, deren Wiedergabe erst aufgelöst werden muss (Künstler → Top-Track-URIs).
+
+    Ein Tap bekommt die URI-Liste aus dem Speicher, auch wenn sie älter als
+    `ttl` ist; abgelaufene Einträge werden dann im Hintergrund neu geladen
+    (stale-while-revalidate). Zusätzlich frischt ein Hintergrund-Thread
+    Einträge kurz vor Ablauf auf. Der Cache liegt als JSON-Datei im Cache-
+    Verzeichnis und übersteht damit Neustarts.
+    """
+
+    def __init__(self, path, loader, ttl=24 * 3600, refresh_interval=3600):
+        self.path = Path(path)
+        self.loader = loader  # key → Liste von URIs
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._entries = self._read()
+
+    def _read(self):
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        with self._lock:
+            data = json.dumps(self._entries)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(data)
+        os.replace(tmp, self.path)
+
+    def _load(self, key):
+        uris = self.loader(key)
+        with self._lock:
+            self._entries[key] = {"uris": uris, "fetched": time.time()}
+        self._write()
+        return uris
+
+    def _load_in_background(self, key):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+
+        def run():
+            try:
+                self._load(key)
+                logging.debug("🔄 Playback-Cache aktualisiert: %s", key)
+            except Exception as e:
+                logging.warning("⚠️ Playback-Cache konnte %s nicht aktualisieren: %s", key, e)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, key):
+        """URIs für `key`; nur bei einem Miss wird synchron geladen."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            CACHE_LOOKUPS.inc(result="miss")
+            return self._load(key)
+        if time.time() - entry["fetched"] > self.ttl:
+            CACHE_LOOKUPS.inc(result="stale")
+            self._load_in_background(key)
+        else:
+            CACHE_LOOKUPS.inc(result="hit")
+        return entry["uris"]
+
+    def prefetch(self, key):
+        """Lädt `key` im Hintergrund vor (z. B. direkt nach dem Beschreiben eines Tags)."""
+        with self._lock:
+            known = key in self._entries
+        if not known:
+            self._load_in_background(key)
+
+    def refresh_due(self):
+        """Lädt alle Einträge neu, die innerhalb des nächsten Intervalls ablaufen."""
+        limit = time.time() - self.ttl + self.refresh_interval
+        with self._lock:
+            due = [key for key, entry in self._entries.items() if entry["fetched"] < limit]
+        for key in due:
+            try:
+                self._load(key)
+            except Exception as e:
+                logging.warning("⚠️ Playback-Cache konnte %s nicht aktualisieren: %s", key, e)
+        return len(due)
+
+    def start_refresher(self):
+        def loop():
+            while True:
+                time.sleep(self.refresh_interval)
+                refreshed = self.refresh_due()
+                if refreshed:
+                    logging.info("🔄 Playback-Cache: %s Einträge aufgefrischt", refreshed)
+
+        threading.Thread(target=loop, daemon=True).start()
@@ -0,0 +1,95 @@
+# profiler.py
+
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+PROFILE_DIR = Path(__file__).resolve().parent.parent / "profiles"
+REQUEST_DIR = Path(__file__).resolve().parent.parent / "run"
+
+_running = threading.Lock()
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def sample(duration=10.0, interval=0.01):
+    """Sammelt `duration` Sekunden lang alle `interval` Sekunden die Stacks aller Threads."""
+    own = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    counts = Counter()
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            if ident not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            counts[f"{names.get(ident, ident)};{_collapse(frame)}"] += 1
+        time.sleep(interval)
+    return counts
+
+
+def write_collapsed(service, counts):
+    """Schreibt Stacks im Collapsed-Format (flamegraph.pl, speedscope) und aktualisiert <service>-latest."""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{service}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+    path.write_text("".join(f"{stack} {n}\n" for stack, n in counts.most_common()))
+    latest = PROFILE_DIR / f"{service}-latest.folded"
+    tmp = latest.with_suffix(".tmp")
+    tmp.write_text(path.read_text())
+    os.replace(tmp, latest)
+    return path
+
+
+def start(service, duration=10.0, interval=0.01):
+    """Startet einen Profiler-Lauf im Hintergrund. False, wenn bereits einer läuft."""
+    if not _running.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            logging.info("🔬 Profiler gestartet (%.0fs, Intervall %.0fms)", duration, interval * 1000)
+            counts = sample(duration, interval)
+            path = write_collapsed(service, counts)
+            logging.info("🔬 Profil gespeichert: %s (%s Samples)", path, sum(counts.values()))
+        except Exception as e:
+            logging.error("❌ Profiler fehlgeschlagen: %s", e)
+        finally:
+            _running.release()
+
+    threading.Thread(target=run, name="profiler", daemon=True).start()
+    return True
+
+
+def request_path(service):
+    return REQUEST_DIR / f"profile-{service}.json"
+
+
+def install_signal_handler(service, signum=signal.SIGUSR1):
+    """Aktiviert den Profiler per Signal (z. B. `systemctl kill -s SIGUSR1 display`).
+
+    Dauer und Intervall werden optional aus run/profile-<service>.json gelesen.
+    """
+
+    def handler(signo, frame):
+        options = {}
+        try:
+            options = json.loads(request_path(service).read_text())
+        except (OSError, ValueError):
+            pass
+        start(service, float(options.get("seconds", 10)), float(options.get("interval", 0.01)))
+
+    signal.signal(signum, handler)
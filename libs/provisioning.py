@@ -0,0 +1,136 @@
+# provisioning.py
+
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+QUEUE_PATH = Path(__file__).resolve().parent.parent / "provisioning.json"
+
+# Spotify-Typ → Tag-Kürzel (wie type_map in rfid.py)
+TYPE_CODES = {"album": "a", "playlist": "p", "artist": "r", "audiobook": "b"}
+
+_URL = re.compile(r"open\.spotify\.com/(?:intl-[\w-]+/)?(album|playlist|artist|audiobook)/([0-9A-Za-z]+)")
+_URI = re.compile(r"^spotify:(album|playlist|artist|audiobook):([0-9A-Za-z]+)$")
+_SHORT = re.compile(r"^([aprb]):([0-9A-Za-z]+)$")
+
+
+def parse_item(text):
+    """Wandelt URL, URI oder Kurzform (a:<id>) in Tag-Daten {"t", "i"} um."""
+    text = text.strip()
+    for pattern in (_URL, _URI):
+        m = pattern.search(text)
+        if m:
+            return {"t": TYPE_CODES[m.group(1)], "i": m.group(2)}
+    m = _SHORT.match(text)
+    if m:
+        return {"t": m.group(1), "i": m.group(2)}
+    raise ValueError(f"Unbekanntes Format: {text}")
+
+
+def payload(item):
+    """Tag-Inhalt im selben Format, das rfid.py beim normalen Schreiben erzeugt."""
+    return json.dumps({"t": item["t"], "i": item["i"]})
+
+
+class ProvisioningQueue:
+    """Warteschlange zu beschreibender Tags, geteilt zwischen web.py (füllt) und rfid.py (arbeitet ab).
+
+    Liegt als JSON-Datei neben config.json; Änderungen laufen unter flock und
+    werden atomar ersetzt. rfid.py liest die Datei nur neu, wenn sich ihre
+    mtime geändert hat.
+    """
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = Path(path)
+        self._cached = None
+        self._cached_mtime = None
+
+    @contextmanager
+    def _locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {"active": False, "items": []}
+
+    def _write(self, data):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """Aktueller Stand; nutzt den Cache, solange sich die Datei nicht geändert hat."""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {"active": False, "items": []}
+        if mtime != self._cached_mtime:
+            self._cached = self._read()
+            self._cached_mtime = mtime
+        return self._cached
+
+    def is_active(self):
+        data = self.load()
+        return data.get("active", False) and any(i["state"] == "pending" for i in data["items"])
+
+    def start(self, items, append=False):
+        with self._locked():
+            data = self._read() if append else {"items": []}
+            for item in items:
+                # Stabile ID: ein Ersetzen der Liste während eines Schreibvorgangs trifft sonst den falschen Eintrag
+                data["items"].append(dict(item, id=uuid.uuid4().hex, state="pending", uid=None, attempts=0, updated=time.time()))
+            data["active"] = True
+            self._write(data)
+
+    def stop(self):
+        with self._locked():
+            data = self._read()
+            data["active"] = False
+            self._write(data)
+
+    def next_pending(self):
+        """Nächster offener Eintrag oder None."""
+        for item in self.load().get("items", []):
+            if item["state"] == "pending":
+                return item
+        return None
+
+    def mark(self, item_id, state, uid=None):
+        """Setzt den Zustand eines Eintrags und zählt den Schreibversuch mit.
+
+        Gibt False zurück, wenn der Eintrag inzwischen nicht mehr in der
+        Warteschlange steht (z. B. durch eine neue Liste aus der Weboberfläche).
+        """
+        with self._locked():
+            data = self._read()
+            item = next((i for i in data["items"] if i.get("id") == item_id), None)
+            if item is None:
+                return False
+            item["state"] = state
+            item["uid"] = uid
+            item["attempts"] = item.get("attempts", 0) + 1
+            item["updated"] = time.time()
+            if not any(i["state"] == "pending" for i in data["items"]):
+                data["active"] = False
+            self._write(data)
+        return True
+
+    def progress(self):
+        data = self.load()
+        counts = {"pending": 0, "written": 0}
+        for item in data.get("items", []):
+            counts[item["state"]] = counts.get(item["state"], 0) + 1
+        return {"active": data.get("active", False), "total": len(data.get("items", [])), **counts, "items": data.get("items", [])}
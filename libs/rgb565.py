@@ -0,0 +1,122 @@
+# rgb565.py
+
+import sys
+import threading
+
+import numpy as np
+
+# 4x4-Bayer-Matrix (Schwellwerte 0..15)
+BAYER_4X4 = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+], dtype=np.int32)
+
+
+def _channel_luts(bits, shift):
+    """Lookup-Tabellen Kanalwert → Anteil am RGB565-Wort: Zeile 0 ohne Dithering, Zeilen 1..16 je Bayer-Schwelle.
+
+    Zeile 0 schneidet ab wie die Shift-Variante. Die Dither-Zeilen runden auf
+    die Stufen, die das Panel tatsächlich darstellt (Vielfache von 255/31
+    bzw. 255/63), und verschieben die Rundungsschwelle je Bayer-Wert. Die
+    Werte sind bereits so gespeichert, dass ein nativer uint16-Puffer im
+    Speicher Big Endian enthält – das spart das Umkopieren nach '>u2'.
+    """
+    top = (1 << bits) - 1
+    values = np.arange(256, dtype=np.int64)
+    rows = [values >> (8 - bits)]
+    for threshold in range(16):
+        rows.append(np.minimum((values * top * 32 + (threshold * 2 + 1) * 255) // (255 * 32), top))
+    lut = (np.stack(rows) << shift).astype(np.uint16)
+    if sys.byteorder == "little":
+        lut = lut.byteswap()
+    return lut.reshape(-1)
+
+
+_LUTS = (_channel_luts(5, 11), _channel_luts(6, 5), _channel_luts(5, 0))
+
+MODES = ("plain", "lut", "dither")
+
+
+class Converter:
+    """RGB → RGB565 (Big Endian) in wiederverwendeten Puffern, ohne Zwischenarrays je Aufruf.
+
+    Modi:
+      plain   Shift/Maske in-place (im Benchmark die schnellste Variante)
+      lut     je Kanal ein np.take aus einer Tabelle (bitgleich zu plain)
+      dither  geordnetes 4x4-Bayer-Dithering: Die Schwelle je Pixel steckt als
+              Zeilen-Offset im Tabellenindex, kostet also keinen zusätzlichen
+              Durchlauf und mildert Banding in Verläufen
+    """
+
+    def __init__(self, width, height, mode="plain"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}.")
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self._out = np.empty((height, width), dtype=np.uint16)
+        self._tmp = np.empty((height, width), dtype=np.uint16)
+        if mode == "dither":
+            tiles = np.tile(BAYER_4X4, (height // 4 + 1, width // 4 + 1))[:height, :width]
+            self._offset = ((tiles + 1) * 256).astype(np.intp)
+            self._index = np.empty((height, width), dtype=np.intp)
+
+    def convert(self, image):
+        rgb = np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+        if rgb.shape[:2] != (self.height, self.width):
+            raise ValueError(f"Image must be {self.width}x{self.height}.")
+        out, tmp = self._out, self._tmp
+
+        if self.mode == "plain":
+            for channel, mask, shift in ((0, 0xF8, 8), (1, 0xFC, 3), (2, 0xFF, -3)):
+                target = out if channel == 0 else tmp
+                np.copyto(target, rgb[..., channel])
+                if mask != 0xFF:
+                    np.bitwise_and(target, mask, out=target)
+                if shift > 0:
+                    np.left_shift(target, shift, out=target)
+                else:
+                    np.right_shift(target, -shift, out=target)
+                if channel:
+                    np.bitwise_or(out, tmp, out=out)
+            if sys.byteorder == "little":
+                out.byteswap(inplace=True)
+            return out.tobytes()
+
+        for channel, lut in enumerate(_LUTS):
+            target = out if channel == 0 else tmp
+            if self.mode == "dither":
+                np.add(rgb[..., channel], self._offset, out=self._index)
+                np.take(lut, self._index, out=target)
+            else:
+                np.take(lut, rgb[..., channel], out=target)
+            if channel:
+                np.bitwise_or(out, tmp, out=out)
+        return out.tobytes()
+
+
+_converters = {}
+_converters_lock = threading.Lock()
+
+
+def to_rgb565(image, mode="plain"):
+    """Konvertiert ein PIL-Bild in einen RGB565-Framebuffer (Big Endian), wie ihn der ST7789 erwartet."""
+    key = (image.size, mode)
+    with _converters_lock:
+        converter = _converters.get(key)
+        if converter is None:
+            converter = _converters[key] = Converter(image.size[0], image.size[1], mode)
+        return converter.convert(image)
+
+
+def to_rgb565_shift(image):
+    """Ursprüngliche Umrechnung mit temporären Arrays (Referenz für den Benchmark)."""
+    img = np.asarray(image.convert("RGB"), dtype=np.uint16)
+    value = ((img[..., 0] & 0xF8) << 8) | ((img[..., 1] & 0xFC) << 3) | (img[..., 2] >> 3)
+    return value.astype(">u2").tobytes()
+
+
+def frame_size(width, height):
+    return width * height * 2
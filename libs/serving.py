@@ -0,0 +1,177 @@
+# serving.py
+
+import logging
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, load_ssl_context
+
+from libs import metrics
+
+HTTP_LATENCY = metrics.histogram("http_request_seconds", "Bearbeitungszeit der HTTP-Requests", ("method", "route"))
+
+
+class RequestStats:
+    """Zählt Requests und hält die letzten Latenzen je Route für Perzentile."""
+
+    def __init__(self, window=2048):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.window = window
+
+    def record(self, route, seconds):
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {"count": 0, "total": 0.0, "samples": deque(maxlen=self.window)}
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["samples"].append(seconds)
+
+    def snapshot(self):
+        result = {}
+        with self._lock:
+            for route, entry in self._routes.items():
+                samples = sorted(entry["samples"])
+                result[route] = {
+                    "count": entry["count"],
+                    "avg_ms": entry["total"] * 1000 / entry["count"],
+                    "p50_ms": samples[len(samples) // 2] * 1000,
+                    "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+                }
+        return result
+
+
+class TimingMiddleware:
+    """WSGI-Middleware, die die Bearbeitungszeit jedes Requests erfasst.
+
+    Als Route dient die passende Flask-Regel (/upload/<id>), nicht der
+    gesendete Pfad – sonst könnte jeder Client beliebig viele Reihen anlegen.
+    Unbekannte Pfade landen gesammelt unter "other".
+    """
+
+    def __init__(self, app, stats):
+        self.app = app
+        self.stats = stats
+
+    def _route(self, environ):
+        url_map = getattr(self.app, "url_map", None)
+        if url_map is None:
+            return "other"
+        try:
+            rule, _ = url_map.bind_to_environ(environ).match(return_rule=True)
+        except HTTPException:  # 404, 405 und Redirects (fehlender Schrägstrich)
+            return "other"
+        return rule.rule
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = self._route(environ)
+            method = environ.get("REQUEST_METHOD") if route != "other" else "other"
+            self.stats.record(f"{method} {route}", elapsed)
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
+
+
+class PooledRequestHandler(WSGIRequestHandler):
+    # HTTP/1.1 nur für Chunked-Antworten: werkzeug sendet immer „Connection: close“,
+    # jede Verbindung trägt also genau einen Request (kein Keep-Alive)
+    protocol_version = "HTTP/1.1"
+    timeout = 15  # Langsame oder hängende Clients geben den Worker spätestens nach 15 s frei
+
+    def log_request(self, code="-", size="-"):
+        pass  # Zugriffslog würde bei 10 Requests/s das Journal fluten
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI-Server mit fester Anzahl Worker-Threads statt einem Thread pro Verbindung."""
+
+    multithread = True
+    daemon_threads = True
+
+    def __init__(self, host, port, app, threads=8, ssl_context=None):
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        super().__init__(host, port, app, handler=PooledRequestHandler, ssl_context=ssl_context)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+def make_server(app, host, port, threads=8, ssl_context=None, stats=None):
+    """Erzeugt einen PooledWSGIServer; optional mit Timing-Middleware."""
+    wsgi_app = TimingMiddleware(app, stats) if stats is not None else app
+    return PooledWSGIServer(host, port, wsgi_app, threads=threads, ssl_context=ssl_context)
+
+
+def _server_with_stats(app, host, port, threads, ssl_context):
+    if isinstance(ssl_context, tuple):
+        # Zertifikat vor dem bind() laden: sonst bliebe der Port bei einem Fehler belegt
+        ssl_context = load_ssl_context(*ssl_context)
+    stats = getattr(app, "request_stats", None)
+    if stats is None:
+        stats = app.request_stats = RequestStats()
+    return make_server(app, host, port, threads=threads, ssl_context=ssl_context, stats=stats), stats
+
+
+def _log_stats(name, stats):
+    for route, s in stats.snapshot().items():
+        logging.info("⏱ %s %s: %s Requests, avg %.1f ms, p99 %.1f ms", name, route, s["count"], s["avg_ms"], s["p99_ms"])
+
+
+def serve_in_thread(app, host, port, threads=8, ssl_context=None, name="app"):
+    """Wie serve(), aber in einem eigenen Thread und ohne Signal-Handler (die gehen nur im Hauptthread).
+
+    Gibt (server, thread) zurück; beendet wird per server.shutdown().
+    """
+    server, stats = _server_with_stats(app, host, port, threads, ssl_context)
+
+    def run():
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            _log_stats(name, stats)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    logging.info("🚀 %s läuft auf %s:%s mit %s Worker-Threads", name, host, port, threads)
+    return server, thread
+
+
+def serve(app, host, port, threads=8, ssl_context=None, name="app"):
+    """Startet `app` produktiv: Thread-Pool, sauberes Beenden bei SIGTERM/SIGINT."""
+    server, stats = _server_with_stats(app, host, port, threads, ssl_context)
+
+    def stop(signum, frame):
+        logging.info("🛑 %s: Signal %s empfangen, beende Server...", name, signum)
+        # shutdown() blockiert bis serve_forever() endet → eigener Thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logging.info("🚀 %s läuft auf %s:%s mit %s Worker-Threads", name, host, port, threads)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        _log_stats(name, stats)
@@ -0,0 +1,199 @@
+# spotify_auth.py
+
+import fcntl
+import json
+import logging
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+import spotipy
+from spotipy.cache_handler import CacheFileHandler
+from spotipy.oauth2 import SpotifyOAuth
+
+from libs import circuit_breaker
+from libs import metrics
+
+CACHE_PATH = Path(__file__).resolve().parent.parent / ".spotify_cache"
+SCOPE = "user-read-playback-state user-modify-playback-state user-read-private user-read-email"
+
+# Vorlauf, mit dem der Hintergrund-Thread das Token vor Ablauf erneuert
+REFRESH_MARGIN = 300  # Sekunden
+
+TOKEN_REFRESHES = metrics.counter("spotify_token_refreshes_total", "Token-Erneuerungen dieses Prozesses", ("result",))
+
+
+class _FileLock:
+    """flock auf `<cache>.lock`, innerhalb eines Prozesses reentrant (flock selbst ist es nicht)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            self._file = open(self.path, "w")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+
+class LockedCacheHandler(CacheFileHandler):
+    """Token-Cache in `.spotify_cache`, den display, rfid und web gemeinsam nutzen.
+
+    Gelesen wird nur, wenn sich die mtime der Datei geändert hat; geschrieben
+    wird atomar unter Dateisperre.
+    """
+
+    def __init__(self, cache_path=CACHE_PATH):
+        super().__init__(cache_path=str(cache_path))
+        self.lock = _FileLock(str(cache_path) + ".lock")
+        self._token = None
+        self._mtime = None
+
+    def get_cached_token(self):
+        try:
+            mtime = os.stat(self.cache_path).st_mtime_ns
+        except FileNotFoundError:
+            self._token, self._mtime = None, None
+            return None
+        if mtime != self._mtime:
+            self._token = super().get_cached_token()
+            self._mtime = mtime
+        return dict(self._token) if self._token else None
+
+    def save_token_to_cache(self, token_info):
+        with self.lock:
+            tmp = f"{self.cache_path}.tmp"
+            try:
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(json.dumps(token_info, cls=self.encoder_cls))
+                os.replace(tmp, self.cache_path)
+            except OSError as e:
+                logging.warning("⚠️ Token konnte nicht gespeichert werden: %s", e)
+
+
+class SharedSpotifyOAuth(SpotifyOAuth):
+    """SpotifyOAuth, das Token-Erneuerungen über alle Prozesse hinweg serialisiert.
+
+    Vor einer Erneuerung wird die Sperre genommen und der Cache neu gelesen:
+    Hat ein anderer Prozess das Token inzwischen erneuert, wird dessen Token
+    übernommen statt selbst einen weiteren Refresh abzusetzen.
+    """
+
+    def refresh_access_token(self, refresh_token):
+        with self.cache_handler.lock:
+            cached = self.cache_handler.get_cached_token()
+            if cached and not self.is_token_expired(cached) and cached.get("access_token"):
+                return cached
+            token_info = super().refresh_access_token(refresh_token)
+            TOKEN_REFRESHES.inc(result="ok" if token_info else "error")
+            return token_info
+
+    def refresh_if_due(self, margin=REFRESH_MARGIN):
+        """Erneuert das Token, wenn es innerhalb von `margin` Sekunden abläuft.
+
+        Gibt die Sekunden bis zum nächsten fälligen Refresh zurück (None ohne Token).
+        """
+        token_info = self.cache_handler.get_cached_token()
+        if not token_info or "refresh_token" not in token_info:
+            return None
+        if token_info["expires_at"] - time.time() < margin:
+            with self.cache_handler.lock:
+                token_info = self.cache_handler.get_cached_token()
+                if token_info["expires_at"] - time.time() < margin:
+                    token_info = super().refresh_access_token(token_info["refresh_token"])
+                    TOKEN_REFRESHES.inc(result="ok" if token_info else "error")
+                    logging.info("🔑 Spotify-Token im Hintergrund erneuert")
+        return token_info["expires_at"] - time.time() - margin
+
+
+def create_oauth(config, open_browser=False):
+    return SharedSpotifyOAuth(
+        client_id=config.get("client_id"),
+        client_secret=config.get("client_secret"),
+        redirect_uri=config.get("redirect_uri"),
+        scope=SCOPE,
+        cache_handler=LockedCacheHandler(),
+        open_browser=open_browser
+    )
+
+
+def start_refresher(auth_manager, margin=REFRESH_MARGIN):
+    """Hintergrund-Thread, der das Token rechtzeitig vor Ablauf erneuert.
+
+    Damit bezahlt kein nutzerseitiger Aufruf (z. B. ein RFID-Tap) den Token-
+    Roundtrip. Der Zufallsanteil verteilt die Prozesse; wer zu spät kommt,
+    findet dank Sperre das bereits erneuerte Token vor.
+    """
+    def loop():
+        while True:
+            try:
+                wait = auth_manager.refresh_if_due(margin)
+            except Exception as e:
+                TOKEN_REFRESHES.inc(result="error")
+                logging.warning("⚠️ Token-Erneuerung fehlgeschlagen: %s", e)
+                wait = 60
+            if wait is None:
+                wait = 60  # noch kein Login
+            time.sleep(max(10, wait + random.uniform(0, 30)))
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread
+
+
+_shared = {"client": None, "auth_manager": None, "refresher": None}
+_shared_lock = threading.Lock()
+
+
+def share_client(config, **kwargs):
+    """All-in-one-Betrieb: Ab jetzt liefert create_spotify() in diesem Prozess immer denselben Client.
+
+    Die Optionen (`requests_timeout`, `retries`, ...) des ersten Aufrufs gelten
+    dann für alle Dienste; ein Client heißt auch nur eine Session, ein Token
+    im Speicher und ein Refresh-Thread.
+    """
+    with _shared_lock:
+        if _shared["client"] is None:
+            _shared["auth_manager"] = create_oauth(config)
+            _shared["client"] = _guarded_client(_shared["auth_manager"], refresh=True, **kwargs)
+            _shared["refresher"] = start_refresher(_shared["auth_manager"])
+        return _shared["client"]
+
+
+def _guarded_client(auth_manager, refresh, **kwargs):
+    sp = spotipy.Spotify(auth_manager=auth_manager, **kwargs)
+    metrics.instrument_spotify(sp)
+    circuit_breaker.guard_spotify(sp, probe=refresh)
+    return sp
+
+
+def create_spotify(config, refresh=True, **kwargs):
+    """Spotify-Client mit gemeinsamem Token-Cache, Metriken, Circuit Breaker und optionalem Hintergrund-Refresh.
+
+    Ohne `refresh` (Web-Service) läuft auch kein eigener Probe-Thread; der
+    Breaker-Zustand wird dann von display und rfid übernommen. Nach
+    share_client() wird der gemeinsame Client zurückgegeben.
+    """
+    if _shared["client"] is not None:
+        return _shared["client"]
+    auth_manager = create_oauth(config)
+    sp = _guarded_client(auth_manager, refresh, **kwargs)
+    if refresh:
+        start_refresher(auth_manager)
+    return sp
@@ -0,0 +1,139 @@
+# tracing.py
+
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+TRACE_URL = "http://127.0.0.1:5055/trace"
+
+_service = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+_buffer = deque(maxlen=2048)    # lokaler Ringpuffer
+_outbox = deque(maxlen=512)     # noch nicht an den Status-Service gesendete Spans
+_lock = threading.Lock()
+_local = threading.local()
+_wakeup = threading.Event()
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def set_trace_id(trace_id):
+    """Setzt die Korrelations-ID für alle folgenden Spans dieses Threads (None = aus)."""
+    _local.trace_id = trace_id
+
+
+def current_trace_id():
+    return getattr(_local, "trace_id", None)
+
+
+def record(name, start, duration, trace_id=None, **args):
+    """Speichert einen abgeschlossenen Span (Start in Sekunden seit Epoch, Dauer in Sekunden)."""
+    trace_id = trace_id or current_trace_id()
+    if trace_id is None:
+        return
+    entry = {
+        "name": name,
+        "trace_id": trace_id,
+        "service": _service,
+        "ts": int(start * 1_000_000),
+        "dur": int(duration * 1_000_000),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": args,
+    }
+    with _lock:
+        _buffer.append(entry)
+        _outbox.append(entry)
+
+
+@contextmanager
+def span(name, trace_id=None, **args):
+    """Misst einen Abschnitt – aber nur, wenn eine Korrelations-ID aktiv ist."""
+    trace_id = trace_id or current_trace_id()
+    if trace_id is None:
+        yield
+        return
+    start = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter() - t0, trace_id, **args)
+
+
+def add_spans(entries):
+    """Übernimmt Spans anderer Prozesse (im Status-Service)."""
+    with _lock:
+        _buffer.extend(entries)
+
+
+def spans(trace_id=None):
+    with _lock:
+        entries = list(_buffer)
+    if trace_id:
+        entries = [e for e in entries if e["trace_id"] == trace_id]
+    return entries
+
+
+def to_chrome_trace(entries):
+    """Konvertiert Spans ins Chrome-Trace-Format (chrome://tracing, Perfetto)."""
+    events = []
+    processes = {}
+    for e in entries:
+        processes[e["pid"]] = e["service"]
+        events.append({
+            "name": e["name"],
+            "cat": e["trace_id"],
+            "ph": "X",
+            "ts": e["ts"],
+            "dur": e["dur"],
+            "pid": e["pid"],
+            "tid": e["tid"],
+            "args": dict(e["args"], trace_id=e["trace_id"]),
+        })
+    for pid, service in processes.items():
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": service}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def set_service(service):
+    """Dienstname in den Spans (ohne Exporter, z. B. im All-in-one-Prozess mit dem Status-Service)."""
+    global _service
+    _service = service
+
+
+def start_exporter(service=None, url=TRACE_URL, interval=2.0):
+    """Sendet neue Spans gebündelt im Hintergrund an den Status-Service."""
+    if service:
+        set_service(service)
+    session = requests.Session()
+
+    def run():
+        while True:
+            _wakeup.wait(interval)
+            _wakeup.clear()
+            with _lock:
+                batch = list(_outbox)
+                _outbox.clear()
+            if not batch:
+                continue
+            try:
+                session.post(url, json={"spans": batch}, timeout=1)
+            except Exception as e:
+                logging.debug("Trace-Export fehlgeschlagen: %s", e)
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+
+
+def flush():
+    """Stößt den sofortigen Export an (z. B. am Ende eines Tap-Ablaufs)."""
+    _wakeup.set()
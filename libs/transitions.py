@@ -0,0 +1,100 @@
+# transitions.py
+
+import logging
+import time
+
+import numpy as np
+
+from libs import metrics
+
+TRANSITION_FPS = metrics.gauge("display_transition_fps", "Erreichte Bildrate der letzten Überblendung")
+TRANSITION_FRAMES = metrics.counter("display_transition_frames_total", "Übertragene bzw. verworfene Übergangs-Frames", ("result",))
+
+EFFECTS = ("none", "crossfade", "slide")
+
+
+def _unpack(frame, width, height):
+    """RGB565-Framebuffer (Big Endian) → Kanäle als int16 (R 0..31, G 0..63, B 0..31)."""
+    value = np.frombuffer(frame, dtype=">u2").reshape(height, width).astype(np.uint16)
+    return tuple(channel.astype(np.int16) for channel in (value >> 11, (value >> 5) & 0x3F, value & 0x1F))
+
+
+def crossfade(old, new, width, height):
+    """Liefert render(progress) für eine Überblendung direkt in den 5/6/5-Bit-Kanälen.
+
+    Beide Bilder werden nur einmal entpackt; pro Frame bleibt ein Multiply-Add
+    je Kanal und das Zurückpacken in einen wiederverwendeten Puffer.
+    """
+    old_ch = _unpack(old, width, height)
+    delta = [n - o for n, o in zip(_unpack(new, width, height), old_ch)]
+    out = np.empty((height, width), dtype=np.uint16)
+    tmp = np.empty((height, width), dtype=np.int16)
+
+    def render(progress):
+        alpha = int(progress * 256)
+        out.fill(0)
+        for channel, shift in enumerate((11, 5, 0)):
+            np.multiply(delta[channel], alpha, out=tmp)
+            np.right_shift(tmp, 8, out=tmp)
+            np.add(tmp, old_ch[channel], out=tmp)
+            np.bitwise_or(out, tmp.astype(np.uint16) << shift, out=out)
+        return out.astype(">u2").tobytes()
+
+    return render
+
+
+def slide(old, new, width, height):
+    """Liefert render(progress): Das neue Bild schiebt sich von rechts herein (nur Spalten umkopieren)."""
+    old_px = np.frombuffer(old, dtype=">u2").reshape(height, width)
+    new_px = np.frombuffer(new, dtype=">u2").reshape(height, width)
+    out = np.empty((height, width), dtype=">u2")
+
+    def render(progress):
+        shift = int(progress * width)
+        out[:, :width - shift] = old_px[:, shift:]
+        out[:, width - shift:] = new_px[:, :shift]
+        return out.tobytes()
+
+    return render
+
+
+def play(disp, old, new, effect="crossfade", duration=0.3, fps=30):
+    """Spielt einen Übergang von `old` nach `new` mit fester Bildrate ab.
+
+    Jeder Frame hat einen festen Zeitschlitz; vor dessen Beginn wird
+    gewartet. Hat beim Erreichen schon der Schlitz des nächsten Frames
+    begonnen, wird der Frame verworfen, ohne ihn zu berechnen. Das Zielbild
+    wird immer gezeigt. Gibt die erreichte Bildrate zurück.
+    """
+    if effect not in EFFECTS or effect == "none" or old is None or len(old) != len(new) or old == new:
+        disp.ShowFrame(new)
+        return None
+
+    render = (crossfade if effect == "crossfade" else slide)(old, new, disp.width, disp.height)
+    steps = max(1, int(duration * fps))
+    frame_time = 1.0 / fps
+    start = time.perf_counter()
+    shown = dropped = 0
+    for i in range(1, steps):
+        due = start + i * frame_time
+        now = time.perf_counter()
+        if now >= due + frame_time:
+            dropped += 1
+            continue
+        if due > now:
+            time.sleep(due - now)
+        disp.ShowFrame(render(i / steps))
+        shown += 1
+    remaining = start + steps * frame_time - time.perf_counter()
+    if remaining > 0:
+        time.sleep(remaining)
+    disp.ShowFrame(new)
+    shown += 1
+
+    elapsed = time.perf_counter() - start
+    achieved = shown / elapsed if elapsed > 0 else 0.0
+    TRANSITION_FPS.set(round(achieved, 1))
+    TRANSITION_FRAMES.inc(shown, result="shown")
+    TRANSITION_FRAMES.inc(dropped, result="dropped")
+    logging.debug("🎞 Übergang '%s': %s/%s Frames in %.0f ms (%.1f FPS)", effect, shown, steps, elapsed * 1000, achieved)
+    return achieved
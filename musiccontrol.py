@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+"""All-in-one-Betrieb: status, web, display und rfid in einem Prozess.
+
+Statt vier Interpretern, die jeder für sich spotipy/requests bzw. NumPy/PIL
+laden, läuft hier ein Prozess mit einem asyncio-Kern, der die Dienste
+überwacht und bei einem Absturz einzeln neu startet. Die blockierenden
+Teile – SPI/I2C-Schleifen von display und rfid, die WSGI-Server – laufen
+in eigenen Threads. Alle Dienste teilen sich einen Spotify-Client (eine
+Session, ein Token im Speicher, ein Refresh-Thread) und den Geräte-Bildindex.
+
+Ersetzt die vier Units durch musiccontrol.service (siehe dort); die Einzel-
+Dienste bleiben unverändert lauffähig. Speichervergleich:
+benchmarks/bench_memory.py.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import threading
+import time
+from pathlib import Path
+
+from libs import logsetup
+from libs import metrics
+from libs import profiler
+from libs import serving
+from libs import spotify_auth
+from libs import tracing
+
+BASE_PATH = Path(__file__).resolve().parent
+
+PROCESS_RSS = metrics.gauge("process_resident_bytes", "Resident Set Size des All-in-one-Prozesses")
+SERVICE_RESTARTS = metrics.counter("musiccontrol_restarts_total", "Neustarts einzelner Dienste im All-in-one-Prozess", ("service",))
+
+# Wartezeiten bis zum Neustart eines abgestürzten Dienstes
+RESTART_BACKOFF = (2, 5, 10, 30, 60)  # Sekunden
+
+SERVICES = ("status", "web", "display", "rfid")
+
+servers = {}  # Name → laufender WSGI-Server (für das Beenden)
+web_refresher_started = False
+
+
+def load_config():
+    config_path = BASE_PATH / "config.json"
+    if config_path.exists():
+        with open(config_path) as f:
+            return json.load(f)
+    return {}
+
+
+def in_thread(name, fn, *args):
+    """Führt eine blockierende Funktion in einem Daemon-Thread aus und liefert ein awaitbares Future.
+
+    Bewusst nicht asyncio.to_thread: dessen Executor-Threads sind keine
+    Daemons, und die Endlosschleifen von display/rfid würden das Beenden blockieren.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def done(result, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run():
+        try:
+            result, error = fn(*args), None
+        except BaseException as e:  # auch SystemExit aus exit(1) eines Dienstes
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(done, result, error)
+        except RuntimeError:
+            pass  # Event-Loop bereits beendet (Prozessende)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+def http_service(name, module, host, port, threads, ssl_context=None, setup=None):
+    def run():
+        imported = __import__(module)
+        if setup is not None:
+            setup(imported)
+        server, thread = serving.serve_in_thread(imported.app, host, port, threads=threads, ssl_context=ssl_context, name=name)
+        servers[name] = server
+        thread.join()
+    return run
+
+
+def setup_web(web):
+    """Weboberfläche auf den All-in-one-Betrieb umstellen; den Status-Cache nur einmal je Prozess starten."""
+    global web_refresher_started
+    web.all_in_one = True  # Neustart/Update über musiccontrol.service, Profiler im Prozess
+    if not web_refresher_started:
+        web.start_state_refresher()
+        web_refresher_started = True
+
+
+def display_service():
+    # Bei einem Neustart läuft nur die Schleife neu an; Panels, Client und Threads bleiben (display.setup)
+    import display
+    import web
+    display.main(standalone=False, images=web.device_index)
+
+
+def rfid_service():
+    import rfid
+    rfid.main(standalone=False)
+
+
+async def supervise(name, run, stopping):
+    """Startet `run` im Thread und nach einem Ende (Absturz, exit) mit Backoff erneut."""
+    attempt = 0
+    while not stopping.is_set():
+        started = time.monotonic()
+        try:
+            await in_thread(name, run)
+            logging.warning("⚠️ Dienst %s wurde beendet.", name)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            logging.error("❌ Dienst %s abgestürzt: %r", name, e)
+        if stopping.is_set():
+            return
+        if time.monotonic() - started > 300:
+            attempt = 0  # lief lange stabil → Backoff zurücksetzen
+        delay = RESTART_BACKOFF[min(attempt, len(RESTART_BACKOFF) - 1)]
+        attempt += 1
+        SERVICE_RESTARTS.inc(service=name)
+        logging.info("🔁 Starte %s in %ss neu...", name, delay)
+        try:
+            await asyncio.wait_for(stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def watch_memory(stopping, interval=60):
+    """Schreibt die RSS des Prozesses als Metrik fort (für den Vergleich mit vier Einzelprozessen)."""
+    while not stopping.is_set():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        PROCESS_RSS.set(int(line.split()[1]) * 1024)
+                        break
+        except OSError:
+            pass
+        try:
+            await asyncio.wait_for(stopping.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main_async(args):
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    services = [
+        # status zuerst: display und rfid fragen ihn ab bzw. melden Zustände dorthin
+        ("status", http_service("status", "status", "127.0.0.1", 5055, args.threads)),
+        ("web", http_service("web", "web", "0.0.0.0", 8080, args.threads,
+                             ssl_context=(str(BASE_PATH / "certs" / "rpi.crt"), str(BASE_PATH / "certs" / "rpi.key")),
+                             setup=setup_web)),
+    ]
+    if not args.no_display:
+        services.append(("display", display_service))
+    if not args.no_rfid:
+        services.append(("rfid", rfid_service))
+
+    tasks = [asyncio.create_task(watch_memory(stopping))]
+    for name, run in services:
+        tasks.append(asyncio.create_task(supervise(name, run, stopping)))
+        await asyncio.sleep(0.5)  # Reihenfolge beim Start einhalten
+
+    await stopping.wait()
+    logging.info("🛑 Beende musiccontrol...")
+    for server in list(servers.values()):
+        await in_thread("shutdown", server.shutdown)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="status, web, display und rfid in einem Prozess")
+    parser.add_argument("--threads", type=int, default=4, help="Worker-Threads je HTTP-Server")
+    parser.add_argument("--no-display", action="store_true", help="ohne Display-Dienst (z. B. ohne Panel)")
+    parser.add_argument("--no-rfid", action="store_true", help="ohne RFID-Dienst (z. B. ohne PN532)")
+    args = parser.parse_args()
+
+    # Log-Level aus der Web-UI: Einträge für display, rfid usw. gelten auch hier
+    logsetup.setup("musiccontrol", members=SERVICES)
+    # Ein Client für alle Dienste, mit den Optionen von display/rfid
+    spotify_auth.share_client(
+        load_config(),
+        requests_timeout=10,
+        retries=0,
+        status_forcelist=[500, 502, 503, 504]
+    )
+    # Kein Exporter: der Status-Service läuft im selben Prozess und liest den Span-Puffer direkt
+    tracing.set_service("musiccontrol")
+    profiler.install_signal_handler("musiccontrol")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
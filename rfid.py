@@ -9,23 +9,22 @@ import os
 import RPi.GPIO as GPIO
 from dotenv import load_dotenv
 from libs.SimplePN532 import SimplePN532  # deine angepasste Klasse
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from spotipy.oauth2 import SpotifyClientCredentials
 import requests
 from spotipy.exceptions import SpotifyException
+from libs import metrics
+from libs import logsetup
+from libs import spotify_auth
+from libs import circuit_breaker
+from libs import tracing
+from libs import profiler
+from libs import provisioning
+from libs.playback_cache import ResolvedPlaybackCache
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+RFID_STAGE = metrics.histogram("rfid_stage_seconds", "Dauer der RFID-Verarbeitungsschritte", ("stage",))
+TAGS_HANDLED = metrics.counter("rfid_tags_total", "Verarbeitete Tags nach Ergebnis", ("result",))
 
-logging.getLogger("requests").setLevel(logging.WARNING)
-logging.getLogger("requests").propagate = True
-logging.getLogger("urllib3").setLevel(logging.WARNING)
-# Disable all child loggers of urllib3, e.g. urllib3.connectionpool
-logging.getLogger("urllib3").propagate = True
+# Set up logging (Writer-Thread, Level per Web-UI umschaltbar)
+logsetup.setup("rfid")
 
 # Konfiguration laden
 def load_config():
@@ -39,28 +38,15 @@ def load_config():
 config = load_config()
 # Spotify auth
 try:
-    auth_manager = SpotifyOAuth(
-        client_id=config.get("client_id"),
-        client_secret=config.get("client_secret"),
-        redirect_uri=config.get("redirect_uri"),
-        scope="user-read-playback-state user-modify-playback-state user-read-private user-read-email",
-        cache_path=Path(__file__).resolve().parent / ".spotify_cache",
-        open_browser=False
-        )
-    
-    auth_manager_cc = SpotifyClientCredentials(
-        client_id=config.get("client_id"),
-        client_secret=config.get("client_secret")
-    )
-
-    sp = spotipy.Spotify(
-        auth_manager=auth_manager,
+    # Gemeinsamer Token-Cache mit Sperre; erneuert das Token im Hintergrund vor Ablauf
+    sp = spotify_auth.create_spotify(
+        config,
         requests_timeout=10,
         retries=0,
         status_forcelist=[500, 502, 503, 504]
-    )    
+    )
 except Exception as e:
-    logging.error(f"❌ Spotify Auth fehlgeschlagen: {e}")
+    logging.error("❌ Spotify Auth fehlgeschlagen: %s", e)
     exit(1)
 
 # Tag-Kürzel → Spotify Typ
@@ -73,17 +59,44 @@ type_map = {
 }
 reverse_type_map = {v: k for k, v in type_map.items()}
 
+def current_market():
+    """Markt für Künstler-Top-Tracks (ISO-3166-Code); bei jedem Tap neu gelesen, damit Änderungen aus der Web-UI sofort gelten."""
+    return load_config().get("market") or "DE"
+
+def resolve_uris(key):
+    """Löst einen Cache-Schlüssel "r:<artistId>:<market>" in die Top-Track-URIs auf."""
+    t, i, country = key.split(":")
+    top_tracks = sp.artist_top_tracks(i, country=country)
+    return [track["uri"] for track in top_tracks["tracks"]]
+
+playback_cache = ResolvedPlaybackCache(Path(__file__).resolve().parent / "cache" / "playback.json", resolve_uris)
+
+# Offline aufgelegter Tag: wird abgespielt, sobald Spotify wieder erreichbar ist.
+# Jeder Tap ersetzt die Wiedergabe des vorherigen, daher zählt nur der jüngste.
+pending_tag = None  # (tag_data, Zeitpunkt des Taps)
+PENDING_TAG_MAX_AGE = 600  # Sekunden; ältere Taps werden verworfen
+breaker = circuit_breaker.shared_breaker()
+
 reader = SimplePN532(debug=False)
+provisioning_queue = provisioning.ProvisioningQueue()
+provision_handled_uid = None  # beschrieben, übersprungen oder fehlgeschlagen – gilt, bis der Tag entfernt wird
+background_started = False
+
 
+# Eine Session für die Meldungen an den Status-Service (der Server schließt nach jeder Antwort)
+status_session = requests.Session()
 
 def update_status(status_value: str):
     try:
-        r = requests.post("http://127.0.0.1:5055/status", json={"status": status_value}, timeout=0.5)
-        if logging.getLogger().isEnabledFor(logging.DEBUG):
-            logging.debug(f"📡 Status gesetzt: {status_value} (HTTP {r.status_code})")
+        with RFID_STAGE.time(stage="status_post"), tracing.span(f"status_post {status_value}"):
+            r = status_session.post(
+                "http://127.0.0.1:5055/status",
+                json={"status": status_value, "trace_id": tracing.current_trace_id()},
+                timeout=0.5
+            )
+        logging.debug("📡 Status gesetzt: %s (HTTP %s)", status_value, r.status_code)
     except Exception as e:
-        if logging.getLogger().isEnabledFor(logging.DEBUG):
-            logging.debug(f"⚠️ Status-Post fehlgeschlagen: {e}")
+        logging.debug("⚠️ Status-Post fehlgeschlagen: %s", e)
 
 def get_current_context(mode="auto"):
     try:
@@ -138,29 +151,37 @@ def get_current_context(mode="auto"):
                 if ctype == "audiobook" and uri:
                     return "b", uri.split(":")[-1]
 
-        logging.warning(f"⚠️ Keine passende Information für Modus '{mode}' gefunden.")
+        logging.warning("⚠️ Keine passende Information für Modus '%s' gefunden.", mode)
         return None, None
     except SpotifyException as e:
+        # Zuerst: spotipy meldet 5xx nach ausgeschöpften Retries als 429 („Max Retries“)
+        if circuit_breaker.is_outage(e):
+            logging.warning("📴 Spotify-Serverfehler – kein Kontext zum Schreiben verfügbar: %s", e)
+            return None, None
         if e.http_status == 429:
             retry_after = int(e.headers.get("Retry-After", 5))
-            logging.warning(f"⚠️ Rate Limit! Warte {retry_after} Sekunden...")
+            logging.warning("⚠️ Rate Limit! Warte %s Sekunden...", retry_after)
             time.sleep(retry_after)
         else:            
-            logging.error(f"❌ Fehler beim Lesen des Spotify-Kontexts: {e}")
+            logging.error("❌ Fehler beim Lesen des Spotify-Kontexts: %s", e)
             return None, None
     except Exception as e:
-        logging.error(f"❌ Fehler beim Lesen des Spotify-Kontexts: {e}")
+        if circuit_breaker.is_outage(e):
+            logging.warning("📴 Spotify offline – kein Kontext zum Schreiben verfügbar.")
+        else:
+            logging.error("❌ Fehler beim Lesen des Spotify-Kontexts: %s", e)
         return None, None
 
 
-def handle_existing_tag(tag_data):
+def handle_existing_tag(tag_data, tapped_at=None):
+    global pending_tag
     try:
         data = json.loads(tag_data)
         t = data.get("t")
         i = data.get("i")
         if not t or not i:
             raise ValueError("⚠️ Ungültige Tag-Daten")
-        logging.debug(f"🎯 Tag erkannt: Type={t}, ID={i}")
+        logging.debug("🎯 Tag erkannt: Type=%s, ID=%s", t, i)
         if t == "p":
             sp.start_playback(context_uri=f"spotify:playlist:{i}")
         elif t == "a":
@@ -168,8 +189,7 @@ def handle_existing_tag(tag_data):
         elif t == "b":
             sp.start_playback(context_uri=f"spotify:audiobook:{i}")
         elif t == "r":
-            top_tracks = sp.artist_top_tracks(i, country="DE")
-            uris = [track["uri"] for track in top_tracks["tracks"]]
+            uris = playback_cache.get(f"r:{i}:{current_market()}")
             if uris:
                 sp.start_playback(uris=uris)
         elif t == "d":
@@ -177,29 +197,114 @@ def handle_existing_tag(tag_data):
         else:
             logging.warning("❓ Unbekannter Typ im Tag")
     except Exception as e:
-        logging.error(f"❌ Fehler bei der Auswertung des Tags: {e}")
+        if circuit_breaker.is_outage(e):
+            pending_tag = (tag_data, tapped_at or time.time())
+            logging.warning("📥 Spotify offline – Tag wird nach Wiederverbindung abgespielt: %s", tag_data)
+        else:
+            logging.error("❌ Fehler bei der Auswertung des Tags: %s", e)
+
+def replay_pending_tag():
+    """Spielt einen offline aufgelegten Tag ab, sobald der Circuit Breaker wieder geschlossen ist."""
+    global pending_tag
+    if pending_tag is None or not breaker.healthy():
+        return
+    tag_data, tapped_at = pending_tag
+    pending_tag = None
+    if time.time() - tapped_at > PENDING_TAG_MAX_AGE:
+        logging.info("🗑 Gemerkter Tag verworfen (älter als %ss): %s", PENDING_TAG_MAX_AGE, tag_data)
+        return
+    logging.info("📤 Spotify wieder erreichbar – spiele gemerkten Tag ab: %s", tag_data)
+    with RFID_STAGE.time(stage="replay_tag"):
+        handle_existing_tag(tag_data, tapped_at)
+
+def provision_tag(uid, text, successful):
+    """Beschreibt einen leeren Tag mit dem nächsten Eintrag der Provisionierungs-Warteschlange (ohne Spotify-Aufruf)."""
+    global provision_handled_uid
+    if uid == provision_handled_uid:
+        return  # bereits behandelter Tag liegt noch auf dem Leser
+    provision_handled_uid = uid
+
+    if not successful:
+        logging.warning("📄 Tag %s not read successful.", uid.hex())
+        update_status("error")
+        return
+    if text:
+        logging.info("🏷 Tag bereits beschrieben (%s), übersprungen.", text.strip())
+        update_status("error")
+        return
+
+    item = provisioning_queue.next_pending()
+    if item is None:
+        return
+    data = provisioning.payload(item)
+    update_status("writing")
+    with RFID_STAGE.time(stage="provision"), tracing.span("provision", payload=data):
+        # write_tag liest die Datenseiten und die Prüfsummenseite zur Kontrolle zurück
+        _, verified = reader.write_tag(data, uid=uid)
 
-def main():
+    if verified:
+        if not provisioning_queue.mark(item["id"], "written", uid.hex()):
+            logging.info("🏷 Eintrag wurde während des Schreibens aus der Warteschlange entfernt: %s", data)
+        if item["t"] == "r":
+            playback_cache.prefetch(f"r:{item['i']}:{current_market()}")
+        progress = provisioning_queue.progress()
+        logging.info("🏷 Provisioniert (%s/%s): %s", progress['written'], progress['total'], data)
+        update_status("success")
+        TAGS_HANDLED.inc(result="provisioned")
+    else:
+        provisioning_queue.mark(item["id"], "pending")
+        logging.error("🏷 Provisionierung fehlgeschlagen, bitte erneut auflegen: %s", data)
+        update_status("error")
+        TAGS_HANDLED.inc(result="write_failed")
+
+def start_background(standalone=True):
+    """Exporter und Cache-Refresher; nur einmal je Prozess (Neustart durch den Supervisor)."""
+    global background_started
+    if background_started:
+        return
+    metrics.start_socket_exporter(Path(__file__).resolve().parent / "run" / "rfid.sock")
+    if standalone:
+        tracing.start_exporter("rfid")
+        profiler.install_signal_handler("rfid")
+    playback_cache.start_refresher()
+    background_started = True
+
+def main(standalone=True):
+    """Lese-Schleife; `standalone=False` (All-in-one) ohne Signal-Handler und Trace-Export."""
+    global provision_handled_uid
     logging.info("📡 RFID-Service gestartet...")
+    start_background(standalone)
     lastTag = ""
     try:
         while True:
+            tracing.set_trace_id(None)
+            replay_pending_tag()
+            read_start, t0 = time.time(), time.perf_counter()
             id, text, successful = reader.read_tag()
             if not id:
+                provision_handled_uid = None  # Tag entfernt → beim nächsten Auflegen erneut behandeln
                 time.sleep(0.5)
                 continue
 
+            # Neuer Tap → Korrelations-ID für alle folgenden Schritte (auch im Status-Service und Display)
+            tracing.set_trace_id(tracing.new_trace_id())
+            tracing.record("read_tag", read_start, time.perf_counter() - t0)
+
+            if provisioning_queue.is_active():
+                provision_tag(id, text, successful)
+                time.sleep(0.2)
+                continue
+
             update_status("reading")
             
             mode = config.get("rfidMode")            
             if mode == "delete":
                 if text:                    
                     update_status("deleting")
-                    logging.info(f"🗑 Tag {id} wird gelöscht.")
-                    reader.write_tag("")
-                    id, text, successful = reader.read_tag()
-                    logging.info(f"🗑 Tag {id} Inhalt: {text}")
-                    if not text:
+                    logging.info("🗑 Tag %s wird gelöscht.", id)
+                    _, erased = reader.erase_tag(id)
+                    logging.info("🗑 Tag %s gelöscht: %s", id, erased)
+                    if erased:
                         update_status("success")
                     else:
                         update_status("error")
@@ -210,15 +315,19 @@ def main():
                     update_status("success")
                     text = text.strip()
                     if (lastTag==text):
-                        logging.debug(f"📄 Not switching to: {text} since no change")
+                        logging.debug("📄 Not switching to: %s since no change", text)
                     else:
-                        logging.info(f"📄 Gelesener Tag: {text}")                        
-                        handle_existing_tag(text)
+                        logging.info("📄 Gelesener Tag: %s", text)                        
+                        with RFID_STAGE.time(stage="handle_tag"), tracing.span("handle_tag", tag=text):
+                            handle_existing_tag(text)
+                        tracing.flush()
                         lastTag=text
+                    TAGS_HANDLED.inc(result="read")
                 else:
-                    logging.debug(f"📄 Gelesener Tag leer")
+                    logging.debug("📄 Gelesener Tag leer")
                     update_status("writing")
-                    t, i = get_current_context(mode)
+                    with RFID_STAGE.time(stage="get_context"), tracing.span("get_context"):
+                        t, i = get_current_context(mode)
                     if not t or not i:
                         logging.warning("🚫 Kein gültiger Kontext zum Schreiben")
                         continue
@@ -226,24 +335,29 @@ def main():
                     if mode in type_map and mode != "auto":
                         t = reverse_type_map.get(mode, t)
                     data = json.dumps({"t": t, "i": i})
-                    id, written = reader.write_tag(data)
+                    with tracing.span("write_tag"):
+                        id, written = reader.write_tag(data, uid=id)
                     
                     if written:                         
-                        update_status("reading")
-                        id, text = reader.read_tag()
-                        logging.debug(f"📝 Verifiziert: {text}")
-                        logging.info(f"📝 Geschrieben: {data}")
+                        if t == "r":
+                            playback_cache.prefetch(f"r:{i}:{current_market()}")
+                        logging.info("📝 Geschrieben: %s", data)
                         update_status("success")
+                        TAGS_HANDLED.inc(result="written")
                     else:                    
-                        logging.error(f"📝 Daten nicht geschrieben: {data}")
+                        logging.error("📝 Daten nicht geschrieben: %s", data)
                         update_status("error")
+                        TAGS_HANDLED.inc(result="write_failed")
             else:
-                logging.warning(f"📄 Tag {id} not read successful.")
+                logging.warning("📄 Tag %s not read successful.", id)
                 update_status("error")
+                TAGS_HANDLED.inc(result="read_failed")
                         
             time.sleep(1)
     finally:
-        GPIO.cleanup()
+        # Im All-in-one-Prozess gehören die Pins dem Display (RST/DC/Backlight)
+        if standalone:
+            GPIO.cleanup()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
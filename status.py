@@ -1,36 +1,33 @@
 #!/usr/bin/env python3
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from threading import Lock, Timer
-import logging
+import argparse
 import time
+from libs.serving import serve
+from libs import metrics
+from libs import logsetup
+from libs import tracing
+from libs import profiler
 
 app = Flask(__name__)
 
 # Interner Zustand
-status = {"value": "playing", "timestamp": time.time()}
+status = {"value": "playing", "timestamp": time.time(), "trace_id": None}
 lock = Lock()
 reset_timer = None
 RESET_DELAY = 3  # Sekunden
 
-# Logging
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+# Logging (Writer-Thread, Level per Web-UI umschaltbar)
+logsetup.setup("status")
 
-logging.getLogger('werkzeug').setLevel(logging.WARNING)
-logging.getLogger("requests").setLevel(logging.WARNING)
-logging.getLogger("requests").propagate = True
-logging.getLogger("urllib3").setLevel(logging.WARNING)
-# Disable all child loggers of urllib3, e.g. urllib3.connectionpool
-logging.getLogger("urllib3").propagate = True
+STATUS_CHANGES = metrics.counter("status_changes_total", "Gesetzte Status-Werte", ("status",))
 
 def reset_status():
     global status
     with lock:
         status["value"] = "playing"
         status["timestamp"] = time.time()
+        status["trace_id"] = None
 
 def schedule_reset():
     global reset_timer
@@ -41,8 +38,10 @@ def schedule_reset():
 
 @app.route("/status", methods=["POST"])
 def set_status():
+    start = time.perf_counter()
     data = request.get_json()
     new_status = data.get("status")
+    trace_id = data.get("trace_id")
 
     if new_status not in ["playing", "writing", "success", "error", "deleting","reading"]:
         return jsonify({"error": "Invalid status"}), 400
@@ -50,6 +49,10 @@ def set_status():
     with lock:
         status["value"] = new_status
         status["timestamp"] = time.time()
+        # Korrelations-ID weiterreichen, damit das Display seine Spans demselben Tap zuordnet
+        status["trace_id"] = trace_id
+    STATUS_CHANGES.inc(status=new_status)
+    tracing.record(f"status {new_status}", status["timestamp"], time.perf_counter() - start, trace_id)
 
     if new_status != "playing":
         schedule_reset()
@@ -61,5 +64,29 @@ def get_status():
     with lock:
         return jsonify(status)
 
+@app.route("/trace", methods=["POST"])
+def add_trace():
+    data = request.get_json(silent=True) or {}
+    tracing.add_spans(data.get("spans", []))
+    return jsonify(success=True)
+
+@app.route("/trace", methods=["GET"])
+def get_trace():
+    """Alle gesammelten Spans (optional ?trace_id=...) im Chrome-Trace-Format."""
+    return jsonify(tracing.to_chrome_trace(tracing.spans(request.args.get("trace_id"))))
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5055)
+    parser = argparse.ArgumentParser(description="Status-Service")
+    parser.add_argument("--threads", type=int, default=4, help="Anzahl Worker-Threads")
+    parser.add_argument("--dev", action="store_true", help="Flask-Entwicklungsserver verwenden")
+    args = parser.parse_args()
+
+    profiler.install_signal_handler("status")
+    if args.dev:
+        app.run(host="127.0.0.1", port=5055)
+    else:
+        serve(app, "127.0.0.1", 5055, threads=args.threads, name="status")
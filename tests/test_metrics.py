@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from libs import metrics  # noqa: E402
+
+
+def test_mixed_label_types_render():
+    counter = metrics.Counter("test_requests_total", "Test", ("endpoint", "status"))
+    counter.inc(endpoint="GET me", status=429)
+    counter.inc(endpoint="GET me", status="error")
+    counter.inc(endpoint="GET me", status=429)
+
+    lines = counter.render()
+
+    assert 'test_requests_total{endpoint="GET me",status="429"} 2' in lines
+    assert 'test_requests_total{endpoint="GET me",status="error"} 1' in lines
+
+
+def test_int_and_str_label_share_series():
+    gauge = metrics.Gauge("test_gauge", "Test", ("code",))
+    gauge.set(1, code=200)
+    gauge.set(2, code="200")
+
+    assert gauge.render()[2:] == ['test_gauge{code="200"} 2']
+
+
+def test_histogram_mixed_label_types_render():
+    histogram = metrics.Histogram("test_seconds", "Test", ("status",), buckets=(0.1,))
+    histogram.observe(0.05, status=500)
+    histogram.observe(0.2, status="error")
+
+    text = "\n".join(histogram.render())
+
+    assert 'test_seconds_count{status="500"} 1' in text
+    assert 'test_seconds_count{status="error"} 1' in text
@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+from flask import Flask
+from werkzeug.test import Client
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from libs import serving  # noqa: E402
+
+
+def test_timing_uses_rule_and_buckets_unknown_paths():
+    app = Flask(__name__)
+
+    @app.route("/upload/<device_id>")
+    def upload(device_id):
+        return device_id
+
+    stats = serving.RequestStats()
+    client = Client(serving.TimingMiddleware(app, stats))
+    for path in ("/upload/1", "/upload/2", "/x/y", "/abc", "/upload/1/extra"):
+        client.get(path)
+    client.delete("/upload/1")
+
+    assert sorted(stats.snapshot()) == ["GET /upload/<device_id>", "other other"]
@@ -1,39 +1,47 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Flask, request, render_template, redirect, url_for, jsonify
-from spotipy import Spotify
-from spotipy.oauth2 import SpotifyOAuth
+from flask import Flask, request, render_template, redirect, url_for, jsonify, Response
 from PIL import Image
+from libs.image_decode import decode_for_display
+from libs import rgb565
+from libs.device_images import DeviceImageIndex
+from libs import provisioning
 from pathlib import Path
 import logging
+import math
 import os
 import json
 import json
+import threading
+import time
+import argparse
+import io
+import queue
+import re
 from dotenv import load_dotenv
+from libs.serving import serve
+from libs import metrics
+from libs import logsetup
+from libs import spotify_auth
+from libs import profiler
 
 # Konfiguration
 BASE_PATH = Path(__file__).resolve().parent
 CONFIG_PATH = BASE_PATH / "config.json"
 IMAGE_DIR = BASE_PATH / "static" / "images"
 IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+RUN_DIR = BASE_PATH / "run"
+FRAME_DIR = IMAGE_DIR / "frames"   # display-fertige RGB565-Frames (unrotiert, Rotation per MADCTL)
+THUMB_DIR = IMAGE_DIR / "thumbs"   # kleine Vorschaubilder für die Weboberfläche
 
 # Flask App
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = IMAGE_DIR
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # max 5MB
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
-
-logging.getLogger('werkzeug').setLevel(logging.WARNING)
-logging.getLogger("requests").setLevel(logging.WARNING)
-logging.getLogger("requests").propagate = True
-logging.getLogger("urllib3").setLevel(logging.WARNING)
-# Disable all child loggers of urllib3, e.g. urllib3.connectionpool
-logging.getLogger("urllib3").propagate = True
+# Logging (Writer-Thread, Level per Web-UI umschaltbar)
+logsetup.setup("web")
 
 # Konfiguration laden
 def load_config():
@@ -54,42 +62,199 @@ def save_config(data):
     with open(CONFIG_PATH, "w") as f:
         json.dump(data, f, indent=2)
 
+# Langlebiger Spotify-Client (wird nur bei geänderten Zugangsdaten neu erzeugt)
+_spotify_client = {"key": None, "sp": None}
+
+# Zwischengespeicherter Status für die Weboberfläche
+STATE_TTL = 30  # Sekunden
+state = {
+    "spotify": {"ok": False, "message": "⏳ Status wird geladen...", "track": None},
+    "devices": [],
+    "updated": 0,
+}
+state_lock = threading.Lock()
+_refresh_event = threading.Event()
+
 # Spotify Auth Manager erzeugen
 def get_spotify(config):
     if not all([config.get("client_id"), config.get("client_secret"), config.get("redirect_uri")]):
         return None, "⚠️ Spotify Zugangsdaten unvollständig."
+    key = (config["client_id"], config["client_secret"], config["redirect_uri"])
+    if _spotify_client["key"] == key:
+        return _spotify_client["sp"], None
     try:
-        sp = Spotify(auth_manager=SpotifyOAuth(
-            client_id=config["client_id"],
-            client_secret=config["client_secret"],
-            redirect_uri=config["redirect_uri"],
-            scope="user-read-playback-state user-read-private",
-            cache_path=BASE_PATH / ".spotify_cache",
-            open_browser=True
-        ))
+        # Token-Erneuerung übernehmen display.py und rfid.py im Hintergrund; der gemeinsame
+        # Cache unter Sperre verhindert, dass mehrere Prozesse gleichzeitig erneuern.
+        # Wie display/rfid: keine Retries, 5xx als Ausfall – ein Rate-Limit bleibt so als 429 mit
+        # Retry-After erkennbar und öffnet den gemeinsamen Circuit Breaker nicht
+        sp = spotify_auth.create_spotify(
+            config,
+            refresh=False,
+            requests_timeout=10,
+            retries=0,
+            status_forcelist=[500, 502, 503, 504]
+        )
+        _spotify_client["key"], _spotify_client["sp"] = key, sp
         return sp, None
     except Exception as e:
         return None, f"❌ Fehler beim Authentifizieren: {e}"
 
+provisioning_queue = provisioning.ProvisioningQueue()
+
+# Gemeinsamer Bildindex mit display.py (erkennt neue Dateien über die Verzeichnis-mtime)
+device_index = DeviceImageIndex(IMAGE_DIR)
+
+# Hintergrund-Verarbeitung der Uploads
+upload_queue = queue.Queue()
+_upload_worker = {"thread": None}
+_upload_worker_lock = threading.Lock()
+
+def atomic_write(path, data):
+    """Schreibt erst in eine temporäre Datei und ersetzt dann atomar – Leser sehen nie halbe Dateien."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def render_device_image(device_id, data):
+    """Erzeugt aus einem Upload alle Artefakte: RGB565-Frame, JPEG und Thumbnail."""
+    FRAME_DIR.mkdir(parents=True, exist_ok=True)
+    THUMB_DIR.mkdir(parents=True, exist_ok=True)
+    image = decode_for_display(io.BytesIO(data), 240, 240, crop_square=True)
+
+    atomic_write(FRAME_DIR / f"{device_id}.rgb565", rgb565.to_rgb565(image))
+
+    buf = io.BytesIO()
+    image.resize((120, 120)).save(buf, "JPEG", quality=85)
+    atomic_write(THUMB_DIR / f"{device_id}.jpg", buf.getvalue())
+
+    # JPEG zuletzt: Ältere Leser (und Fallbacks) sehen erst dann das neue Bild
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=90)
+    atomic_write(IMAGE_DIR / f"{device_id}.jpg", buf.getvalue())
+
+    device_index.invalidate()
+    with state_lock:
+        for d in state["devices"]:
+            if d["id"] == device_id:
+                d["image"] = device_index.web_image(device_id)
+    logging.info("🖼 Gerätebild für %s vorbereitet.", device_id)
+
+def ensure_upload_worker():
+    """Startet den Upload-Worker beim ersten Upload."""
+    with _upload_worker_lock:
+        if _upload_worker["thread"] is not None:
+            return
+
+        def run():
+            while True:
+                device_id, data = upload_queue.get()
+                try:
+                    render_device_image(device_id, data)
+                except Exception as e:
+                    logging.error("❌ Verarbeitung des Uploads für %s fehlgeschlagen: %s", device_id, e)
+                finally:
+                    upload_queue.task_done()
+
+        _upload_worker["thread"] = threading.Thread(target=run, name="upload", daemon=True)
+        _upload_worker["thread"].start()
+
+def refresh_state():
+    """Fragt Account-Status und Geräteliste bei Spotify ab und aktualisiert den Cache."""
+    config = load_config()
+    spotify_status = {"ok": False, "message": "❌ Nicht verbunden", "track": None}
+    devices = []
+
+    sp, error = get_spotify(config)
+    if error:
+        spotify_status["message"] = error
+    elif sp:
+        try:
+            me = sp.me()
+            if me:
+                spotify_status["ok"] = True
+                spotify_status["message"] = "✅ Verbunden"
+            else:
+                spotify_status["message"] = "🔇 Nicht verbunden"
+        except Exception as e:
+            spotify_status["message"] = f"❌ Fehler beim Abrufen: {e}"
+
+        if spotify_status["ok"]:
+            try:
+                for d in sp.devices().get('devices', []):
+                    devices.append({
+                        "id": d.get("id"),
+                        "name": d.get("name", "Unnamed"),
+                        "type": d.get("type"),
+                        "is_active": d.get("is_active", False),
+                        "image": device_index.web_image(d.get("id")),
+                    })
+            except Exception as e:
+                logging.warning("⚠️ Geräteliste nicht abrufbar: %s", e)
+
+    with state_lock:
+        state["spotify"] = spotify_status
+        state["devices"] = devices
+        state["updated"] = time.time()
+
+def request_refresh():
+    """Stößt eine sofortige Aktualisierung des Status-Caches im Hintergrund an."""
+    _refresh_event.set()
+
+def start_state_refresher(interval=STATE_TTL):
+    """Startet den Hintergrund-Thread, der den Status-Cache aktuell hält."""
+
+    def run():
+        while True:
+            try:
+                refresh_state()
+            except Exception as e:
+                logging.error("❌ Fehler beim Aktualisieren des Status: %s", e)
+            _refresh_event.wait(interval)
+            _refresh_event.clear()
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+
+def get_state():
+    with state_lock:
+        return {
+            "spotify": dict(state["spotify"]),
+            "devices": [dict(d) for d in state["devices"]],
+            "updated": state["updated"],
+        }
+
 @app.route("/auth/reset", methods=["POST"])
 def reset_auth():
     """Löscht Cache-Dateien und erzwingt neue Spotify-Authentifizierung"""
     try:
-        for file in Path(".").glob(".spotify_cache*"):
-            file.unlink()
+        for file in spotify_auth.CACHE_PATH.parent.glob(".spotify_cache*"):
+            if file.suffix != ".lock":
+                file.unlink()
+        _spotify_client["key"] = None
+        request_refresh()
         return jsonify({"status": "success", "message": "Auth cache cleared. Restart required."})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# Läuft web im All-in-one-Prozess? (setzt musiccontrol.py beim Start)
+all_in_one = False
+SERVICE_UNITS = ("status", "rfid", "display", "web")
+
+def restart_services():
+    """Startet die Dienste per systemctl neu – im All-in-one-Betrieb nur musiccontrol.service.
+
+    Die Einzel-Units stehen dort in Conflicts=; sie neu zu starten, würde
+    musiccontrol beenden und stillschweigend auf vier Prozesse zurückwechseln.
+    """
+    import subprocess
+    for unit in ("musiccontrol",) if all_in_one else SERVICE_UNITS:
+        subprocess.Popen(["sudo", "systemctl", "restart", unit])
+
 @app.route("/system/restart", methods=["POST"])
 def restart_system():
     """Startet das System neu (z. B. per systemctl)"""
-    import subprocess
     try:
-        subprocess.Popen(["sudo", "systemctl", "restart", "status"])
-        subprocess.Popen(["sudo", "systemctl", "restart", "rfid"])
-        subprocess.Popen(["sudo", "systemctl", "restart", "display"])
-        subprocess.Popen(["sudo", "systemctl", "restart", "web"])
+        restart_services()
         return jsonify({"status": "success", "message": "Service restart initiated."})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -100,62 +265,162 @@ def update_code():
     import subprocess
     try:
         output = subprocess.check_output(["git", "pull"], cwd=str(Path(__file__).resolve().parent))
-        subprocess.Popen(["sudo", "systemctl", "restart", "status"])
-        subprocess.Popen(["sudo", "systemctl", "restart", "rfid"])
-        subprocess.Popen(["sudo", "systemctl", "restart", "display"])
-        subprocess.Popen(["sudo", "systemctl", "restart", "web"])
+        restart_services()
         return jsonify({"status": "success", "message": output.decode("utf-8")})
     except subprocess.CalledProcessError as e:
         return jsonify({"status": "error", "message": e.output.decode("utf-8")}), 500
 
+@app.route("/system/loglevel", methods=["GET"])
+def get_loglevel():
+    return jsonify(logsetup.read_levels())
+
+@app.route("/system/loglevel", methods=["POST"])
+def set_loglevel():
+    """Setzt das Log-Level aller bzw. eines Dienstes; die Dienste übernehmen es innerhalb von 2 s"""
+    service = request.values.get("service") or None
+    if service and service not in PROFILE_SERVICES:
+        return jsonify({"status": "error", "message": "Unknown service"}), 404
+    try:
+        logsetup.write_level(request.values.get("level", "INFO"), service)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    logsetup.apply_level()
+    return jsonify({"status": "success", "message": f"Log-Level {request.values.get('level', 'INFO').upper()} für {service or 'alle Dienste'} gesetzt."})
+
 
 @app.route("/", methods=["GET"])
 def index():
     config = load_config()
-    spotify_status = {"ok": False, "message": "❌ Nicht verbunden", "track": None}
+    current = get_state()
+    if time.time() - current["updated"] > STATE_TTL:
+        request_refresh()
+
+    # Nur wenn Modus device ist
     devices = []
+    if config.get("displayMode") == "device":
+        devices = current["devices"]
+        for d in devices:
+            d["image_url"] = url_for('static', filename=f"images/{d['image']}")
 
-    sp, error = get_spotify(config)
-    if error:
-        spotify_status["message"] = error
-    elif sp:
+    return render_template("index.html", config=config, status=current["spotify"], devices=devices)
+
+@app.route("/api/state", methods=["GET"])
+def api_state():
+    current = get_state()
+    current["age"] = round(time.time() - current["updated"], 1) if current["updated"] else None
+    for d in current["devices"]:
+        d["image_url"] = url_for('static', filename=f"images/{d['image']}")
+    return jsonify(current)
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route("/metrics/<service>", methods=["GET"])
+def get_service_metrics(service):
+    """Reicht die Metriken von display/rfid (Unix-Socket) als Prometheus-Text durch."""
+    if service not in ("display", "rfid"):
+        return "Unknown service", 404
+    try:
+        return Response(metrics.read_socket(RUN_DIR / f"{service}.sock"), mimetype=metrics.CONTENT_TYPE)
+    except OSError as e:
+        return f"Service {service} nicht erreichbar: {e}", 503
+
+@app.route("/trace.json", methods=["GET"])
+def get_trace():
+    """Lädt die Spans aller Dienste vom Status-Service als Chrome-Trace (chrome://tracing / Perfetto)."""
+    import requests
+    try:
+        r = requests.get("http://127.0.0.1:5055/trace", params=request.args, timeout=2)
+        return Response(r.content, mimetype="application/json",
+                        headers={"Content-Disposition": "attachment; filename=trace.json"})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+
+@app.route("/provision", methods=["GET"])
+def provision_progress():
+    return jsonify(provisioning_queue.progress())
+
+@app.route("/provision", methods=["POST"])
+def provision_start():
+    """Füllt die Provisionierungs-Warteschlange (eine URL, URI oder a:<id> pro Zeile)"""
+    items, errors = [], []
+    for line in request.form.get("items", "").splitlines():
+        if not line.strip():
+            continue
         try:
-            me = sp.me()
-            if me:
-                spotify_status["ok"] = True
-                spotify_status["message"] = "✅ Verbunden"
-            else:
-                spotify_status["message"] = "🔇 Nicht verbunden"
-        except Exception as e:
-            spotify_status["message"] = f"❌ Fehler beim Abrufen: {e}"
+            items.append(dict(provisioning.parse_item(line), label=line.strip()))
+        except ValueError as e:
+            errors.append(str(e))
+    if not items:
+        return jsonify({"status": "error", "message": "Keine gültigen Einträge.", "errors": errors}), 400
 
-        # Nur wenn Modus device ist
-        if config.get("displayMode") == "device":
-            try:
-                devices = sp.devices().get('devices', [])
-                for d in devices:
-                    device_id = d.get("id")
-                    device_name = d.get("name", "Unnamed")
-                    image_path = IMAGE_DIR / f"{device_id}.jpg"
-                    d["image_url"] = url_for('static', filename=f"images/{device_id}.jpg") if image_path.exists() \
-                                     else url_for('static', filename="images/default_device.jpg")
-                    d["name"] = device_name
-            except Exception as e:
-                devices = []
+    provisioning_queue.start(items, append=request.form.get("append") == "1")
+    message = f"{len(items)} Tag(s) in der Warteschlange. Leere Tags jetzt nacheinander auflegen."
+    return jsonify({"status": "success", "message": message, "errors": errors})
+
+@app.route("/provision/stop", methods=["POST"])
+def provision_stop():
+    provisioning_queue.stop()
+    return jsonify({"status": "success", "message": "Provisionierung beendet."})
 
-    return render_template("index.html", config=config, status=spotify_status, devices=devices)
+PROFILE_SERVICES = ("display", "rfid", "status", "web")
+
+@app.route("/profile/<service>", methods=["POST"])
+def start_profile(service):
+    """Startet den Sampling-Profiler eines Dienstes (per SIGUSR1, web und All-in-one direkt im Prozess)"""
+    import subprocess
+    if service not in PROFILE_SERVICES:
+        return jsonify({"status": "error", "message": "Unknown service"}), 404
+    try:
+        seconds = float(request.values.get("seconds", 10))
+        if not math.isfinite(seconds):
+            raise ValueError(f"Invalid duration {seconds!r}.")
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    seconds = min(max(seconds, 1), 120)
+    try:
+        if service == "web" or all_in_one:
+            # All-in-one: direkt im Prozess; das Profil enthält dann alle Dienste (Threadname vorn im Stack)
+            started = profiler.start(service, seconds)
+        else:
+            profiler.REQUEST_DIR.mkdir(parents=True, exist_ok=True)
+            profiler.request_path(service).write_text(json.dumps({"seconds": seconds}))
+            subprocess.check_call(["sudo", "systemctl", "kill", "-s", "SIGUSR1", service])
+            started = True
+        if not started:
+            return jsonify({"status": "error", "message": "Profiler läuft bereits."}), 409
+        return jsonify({"status": "success", "message": f"Profiler für {service} läuft {seconds:.0f}s."})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/profile/<service>", methods=["GET"])
+def get_profile(service):
+    """Liefert das letzte Profil eines Dienstes im Collapsed-Stack-Format (flamegraph.pl, speedscope)"""
+    path = profiler.PROFILE_DIR / f"{service}-latest.folded"
+    if service not in PROFILE_SERVICES or not path.exists():
+        return "No profile available", 404
+    return Response(path.read_text(), mimetype="text/plain",
+                    headers={"Content-Disposition": f"attachment; filename={service}.folded"})
 
 @app.route("/save-config", methods=["POST"])
 def save_conf():
-    config = {
+    # Nicht im Formular enthaltene Schlüssel (z. B. imageCacheMB, spiMHz) bleiben erhalten
+    config = load_config()
+    config.update({
         "client_id": request.form.get("client_id", ""),
         "client_secret": request.form.get("client_secret", ""),
         "redirect_uri": request.form.get("redirect_uri", ""),
         "rotation": int(request.form.get("rotation", 0)),
         "displayMode": request.form.get("displayMode", "auto"),
-        "rfidMode": request.form.get("rfidMode", "auto")
-    }
+        "rfidMode": request.form.get("rfidMode", "auto"),
+        "market": request.form.get("market", "DE").strip().upper() or "DE",
+        "sleepDelay": int(request.form.get("sleepDelay", 30) or 30),
+        "transition": request.form.get("transition", "crossfade"),
+        "overlay": request.form.get("overlay", "1") == "1"
+    })
     save_config(config)
+    request_refresh()
     return redirect(url_for("index"))
 
 @app.route("/upload/<device_id>", methods=["POST"])
@@ -167,17 +432,18 @@ def upload(device_id):
     if file.filename == '':
         return "No selected file", 400
 
+    if not re.fullmatch(r"[\w-]+", device_id):
+        return "Invalid device id", 400
+
+    data = file.read()
+    try:
+        Image.open(io.BytesIO(data))  # liest nur den Header: ist es überhaupt ein Bild?
+    except Exception:
+        return "Unsupported image", 400
+
     try:
-        image = Image.open(file.stream).convert("RGB")
-        width, height = image.size
-        min_edge = min(width, height)
-        left = (width - min_edge) // 2
-        top = (height - min_edge) // 2
-        right = left + min_edge
-        bottom = top + min_edge
-        image = image.crop((left, top, right, bottom))
-        image = image.resize((240, 240))
-        image.save(IMAGE_DIR / f"{device_id}.jpg")
+        ensure_upload_worker()
+        upload_queue.put((device_id, data))
         return redirect(url_for('index'))
 
     except Exception as e:
@@ -186,14 +452,7 @@ def upload(device_id):
 @app.route("/login")
 def login():
     config = load_config()
-    sp_oauth = SpotifyOAuth(
-        client_id=config.get("client_id", ""),
-        client_secret=config.get("client_secret", ""),
-        redirect_uri=config.get("redirect_uri", ""),
-        scope="user-read-playback-state user-modify-playback-state user-read-private user-read-email",
-        cache_path=Path(__file__).resolve().parent / ".spotify_cache",
-        open_browser=True
-    )
+    sp_oauth = spotify_auth.create_oauth(config, open_browser=True)
     print("🔁 Using redirect URI:", config["redirect_uri"])
     print("🔁 Client ID:", config["client_id"][:8], "...")  # zur Vermeidung von Leaks
     auth_url = sp_oauth.get_authorize_url()
@@ -202,23 +461,28 @@ def login():
 @app.route("/callback")
 def callback():
     config = load_config()
-    sp_oauth = SpotifyOAuth(
-        client_id=config.get("client_id", ""),
-        client_secret=config.get("client_secret", ""),
-        redirect_uri=config.get("redirect_uri", ""),
-        scope="user-read-playback-state user-modify-playback-state user-read-private user-read-email",
-        cache_path=Path(__file__).resolve().parent / ".spotify_cache",
-        open_browser=True
-    )
+    sp_oauth = spotify_auth.create_oauth(config, open_browser=True)
     code = request.args.get("code")
     if not code:
         return "Missing code in callback", 400
 
     token_info = sp_oauth.get_access_token(code, as_dict=True)
     if token_info:
+        request_refresh()
         return redirect(url_for('index'))
     else:
         return "Authorization failed", 500
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080, ssl_context=("certs/rpi.crt", "certs/rpi.key"))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Web-Oberfläche")
+    parser.add_argument("--threads", type=int, default=4, help="Anzahl Worker-Threads")
+    parser.add_argument("--dev", action="store_true", help="Flask-Entwicklungsserver verwenden")
+    args = parser.parse_args()
+
+    start_state_refresher()
+    profiler.install_signal_handler("web")
+    ssl_context = ("certs/rpi.crt", "certs/rpi.key")
+    if args.dev:
+        app.run(host="0.0.0.0", port=8080, ssl_context=ssl_context)
+    else:
+        serve(app, "0.0.0.0", 8080, threads=args.threads, ssl_context=ssl_context, name="web")
\ No newline at end of file